@@ -1,51 +1,29 @@
 import streamlit as st
-import chromadb
-from transformers import pipeline
 from pathlib import Path
 import tempfile
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
-from docling.document_converter import DocumentConverter, PdfFormatOption
-from docling.backend.docling_parse_v2_backend import DoclingParseV2DocumentBackend
-from docling.datamodel.base_models import InputFormat
-from docling.datamodel.pipeline_options import PdfPipelineOptions, AcceleratorOptions, AcceleratorDevice
+import time
+import logging
+import threading
 from datetime import datetime
-
-
-# Convert uploaded file to markdown text
-def convert_to_markdown(file_path: str) -> str:
-    path = Path(file_path)
-    ext = path.suffix.lower()
-
-    if ext == ".pdf":
-        pdf_opts = PdfPipelineOptions(do_ocr=False)
-        pdf_opts.accelerator_options = AcceleratorOptions(
-            num_threads=4,
-            device=AcceleratorDevice.CPU
-        )
-        converter = DocumentConverter(
-            format_options={
-                InputFormat.PDF: PdfFormatOption(
-                    pipeline_options=pdf_opts,
-                    backend=DoclingParseV2DocumentBackend
-                )
-            }
-        )
-        doc = converter.convert(file_path).document
-        return doc.export_to_markdown(image_mode="placeholder")
-
-    if ext in [".doc", ".docx"]:
-        converter = DocumentConverter()
-        doc = converter.convert(file_path).document
-        return doc.export_to_markdown(image_mode="placeholder")
-
-    if ext == ".txt":
-        try:
-            return path.read_text(encoding="utf-8")
-        except UnicodeDecodeError:
-            return path.read_text(encoding="latin-1", errors="replace")
-
-    raise ValueError(f"Unsupported extension: {ext}")
+from itertools import islice
+
+import config
+from model_registry import get_generator, stream_generate, warm_up, model_stats
+from converters import convert_to_markdown, convert_files, options_fingerprint, warm_up as warm_up_converters
+from markdown_cache import get_cache, get_markdown_store, MarkdownCache
+from vector_store import get_client, get_manifest, content_hash, PREVIEW_CHARS
+from embeddings import get_embedder
+from answer_cache import get_answer_cache, invalidate as invalidate_answers
+from bm25_index import get_lexical_index, drop_lexical_index, reciprocal_rank_fusion
+from reranker import rerank, rerank_stats
+import metrics
+from metrics import span
+from chunking import iter_chunks, prefetch
+from context_packing import pack_context
+from generation_scheduler import SchedulerBusy, get_scheduler
+from ingest_jobs import ACTIVE as ACTIVE_JOB_STATES, Upload, get_job_queue
+
+logger = logging.getLogger(__name__)
 
 
 # Reset ChromaDB collection
@@ -54,54 +32,103 @@ def reset_collection(client, collection_name: str):
         client.delete_collection(name=collection_name)
     except Exception:
         pass
+    getattr(add_text_to_chromadb, 'collections', {}).pop(collection_name, None)
+    invalidate_answers(collection_name)
+    drop_lexical_index(collection_name)
+    if collection_name == "documents":
+        get_manifest().clear()
     return client.create_collection(name=collection_name)
 
 
+# Chunks of up to 700 characters with 100 of overlap, split at markdown
+# headings first, in batches of `size`
+def split_batches(text: str, size: int):
+    chunks = iter_chunks(text, chunk_size=700, chunk_overlap=100)
+    while True:
+        with span("split"):
+            batch = list(islice(chunks, size))
+        if not batch:
+            return
+        yield batch
+
+
+def embed_batches(batches):
+    offset = 0
+    for batch in batches:
+        with span("embed"):
+            embeddings = get_embedder().embed_documents(batch)
+        yield offset, batch, embeddings
+        offset += len(batch)
+
+
 # Add text chunks to ChromaDB
 def add_text_to_chromadb(text: str, filename: str, collection_name: str = "documents"):
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=700,
-        chunk_overlap=100,
-        separators=["\n\n", "\n", " ", ""]
-    )
-    chunks = splitter.split_text(text)
-
     if not hasattr(add_text_to_chromadb, 'client'):
-        add_text_to_chromadb.client = chromadb.Client()
-        add_text_to_chromadb.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        add_text_to_chromadb.client = get_client()
         add_text_to_chromadb.collections = {}
 
     if collection_name not in add_text_to_chromadb.collections:
-        try:
-            collection = add_text_to_chromadb.client.get_collection(name=collection_name)
-        except:
-            collection = add_text_to_chromadb.client.create_collection(name=collection_name)
+        collection = add_text_to_chromadb.client.get_or_create_collection(name=collection_name)
         add_text_to_chromadb.collections[collection_name] = collection
 
     collection = add_text_to_chromadb.collections[collection_name]
+    lexical_index = get_lexical_index(collection)
+
+    # Split, embed and store run as a pipeline: splitting and embedding each
+    # work on their own thread at most PIPELINE_DEPTH batches ahead of the
+    # next stage, so memory stays flat however long the document is, and each
+    # batch is searchable as soon as it is stored
+    start = time.perf_counter()
+    num_chunks = 0
+    depth = config.PIPELINE_DEPTH
+    batches = prefetch(split_batches(text, max(1, config.INSERT_BATCH_SIZE)), depth)
+    for offset, batch, embeddings in prefetch(embed_batches(batches), depth):
+        ids = [f"{filename}_chunk_{offset + j}" for j in range(len(batch))]
+        with span("store"):
+            collection.add(
+                embeddings=embeddings,
+                documents=batch,
+                metadatas=[
+                    {"filename": filename, "chunk_index": offset + j, "chunk_size": len(chunk)}
+                    for j, chunk in enumerate(batch)
+                ],
+                ids=ids
+            )
+            lexical_index.add(ids, batch)
+        num_chunks += len(batch)
+
+    invalidate_answers(collection_name)
+    elapsed = time.perf_counter() - start
+    add_text_to_chromadb.last_stats = {
+        "filename": filename,
+        "chunks": num_chunks,
+        "seconds": elapsed,
+        "chunks_per_sec": num_chunks / elapsed if elapsed > 0 else 0.0,
+    }
+    logger.info("Indexed %s: %d chunks in %.2fs (%.1f chunks/sec)", filename, num_chunks,
+                elapsed, add_text_to_chromadb.last_stats["chunks_per_sec"])
 
-    for i, chunk in enumerate(chunks):
-        embedding = add_text_to_chromadb.embedding_model.encode(chunk).tolist()
-
-        metadata = {
-            "filename": filename,
-            "chunk_index": i,
-            "chunk_size": len(chunk)
-        }
+    return collection
 
-        collection.add(
-            embeddings=[embedding],
-            documents=[chunk],
-            metadatas=[metadata],
-            ids=[f"{filename}_chunk_{i}"]
-        )
 
-    return collection
+# Remove one document's chunks from ChromaDB. The `{filename}_chunk_{i}` ids
+# written above are deleted directly when the chunk count is known, so the
+# cost is proportional to that document alone.
+def delete_document_from_chromadb(collection, filename: str, num_chunks: int = None):
+    if num_chunks is not None:
+        ids = [f"{filename}_chunk_{i}" for i in range(num_chunks)]
+    else:
+        ids = collection.get(where={"filename": filename}, include=[])["ids"]
+    for offset in range(0, len(ids), max(1, config.INSERT_BATCH_SIZE)):
+        collection.delete(ids=ids[offset:offset + config.INSERT_BATCH_SIZE])
+    get_lexical_index(collection).remove(ids)
+    get_manifest().remove(filename)
+    invalidate_answers(collection.name)
 
 
 # Q&A function
 def get_answer(collection, question):
-    results = collection.query(query_texts=[question], n_results=3)
+    results = collection.query(query_embeddings=[get_embedder().embed_query(question)], n_results=3)
     docs = results["documents"][0]
     distances = results["distances"][0]
 
@@ -118,8 +145,8 @@ def get_answer(collection, question):
 
         Answer:"""
 
-    ai_model = pipeline("text2text-generation", model="google/flan-t5-small")
-    response = ai_model(prompt, max_length=150)
+    ai_model = get_generator()
+    response = ai_model(prompt, max_length=config.GENERATION_MAX_LENGTH)
     # return response[0]['generated_text'].strip()
     return str(distances)
 
@@ -170,44 +197,96 @@ def add_holistic_css():
 
 
 # --- Robust file conversion with progress and error handling ---
-def safe_convert_files(uploaded_files):
+# `report(message, fraction=None)` receives progress; by default it drives a
+# progress bar in the page
+def safe_convert_files(uploaded_files, report=None):
     converted_docs = []
     errors = []
     if not uploaded_files:
         return converted_docs, ["No files uploaded"]
-    progress_bar = st.progress(0)
-    status_text = st.empty()
+    if report is None:
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+
+        def report(message, fraction=None):
+            status_text.text(message)
+            if fraction is not None:
+                progress_bar.progress(fraction)
+    total = len(uploaded_files)
+    slots = [None] * total
+    pending = []
+    cache = get_cache()
+    done = 0
+
+    def advance(message):
+        nonlocal done
+        done += 1
+        report(message, done / total)
+
+    # Validate everything and reuse known content before converting anything.
+    # Each upload's bytes are fetched once and handed to the converters in
+    # memory; nothing goes through a temporary file.
     for i, uploaded_file in enumerate(uploaded_files):
         try:
-            status_text.text(f"Converting {uploaded_file.name}...")
-            if len(uploaded_file.getvalue()) > 10 * 1024 * 1024:
-                errors.append(f"{uploaded_file.name}: File too large (max 10MB)")
+            if uploaded_file.size > 10 * 1024 * 1024:
+                slots[i] = f"{uploaded_file.name}: File too large (max 10MB)"
+                advance(f"Skipped {uploaded_file.name}")
                 continue
             allowed_extensions = ['.pdf', '.doc', '.docx', '.txt']
             file_ext = Path(uploaded_file.name).suffix.lower()
             if file_ext not in allowed_extensions:
-                errors.append(f"{uploaded_file.name}: Unsupported file type")
+                slots[i] = f"{uploaded_file.name}: Unsupported file type"
+                advance(f"Skipped {uploaded_file.name}")
                 continue
-            with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
-                tmp.write(uploaded_file.getvalue())
-                tmp_path = tmp.name
-            try:
-                markdown_content = convert_to_markdown(tmp_path)
-                if len(markdown_content.strip()) < 10:
-                    errors.append(f"{uploaded_file.name}: File appears to be empty or corrupted")
-                    continue
-                converted_docs.append({
-                    'filename': uploaded_file.name,
-                    'content': markdown_content,
-                    'size': len(uploaded_file.getvalue()),
-                    'word_count': len(markdown_content.split())
-                })
-            finally:
-                Path(tmp_path).unlink(missing_ok=True)
+            data = uploaded_file.getvalue()
+            digest = content_hash(data)
+            markdown_content, markdown_key = get_manifest().load_content(digest)
+            if markdown_content is None:
+                markdown_key = MarkdownCache.key(data, options_fingerprint(file_ext))
+                if cache is not None:
+                    markdown_content = cache.get(markdown_key)
+            if markdown_content is not None:
+                slots[i] = (markdown_content, digest, markdown_key)
+                advance(f"Reused {uploaded_file.name}")
+                continue
+            pending.append((i, digest, markdown_key, (uploaded_file.name, data)))
         except Exception as e:
-            errors.append(f"{uploaded_file.name}: {str(e)}")
-        progress_bar.progress((i + 1) / len(uploaded_files))
-    status_text.text("Conversion complete!")
+            slots[i] = f"{uploaded_file.name}: {str(e)}"
+            advance(f"Skipped {uploaded_file.name}")
+
+    # Convert the rest, across processes when CONVERSION_WORKERS allows
+    def on_result(j, markdown_content, error):
+        i, digest, markdown_key, _ = pending[j]
+        slots[i] = f"{uploaded_files[i].name}: {error}" if error else (markdown_content, digest, markdown_key)
+        if cache is not None and not error:
+            cache.put(markdown_key, markdown_content)
+        advance(f"Converted {uploaded_files[i].name}")
+
+    if pending:
+        report(f"Converting {len(pending)} file(s)...")
+        convert_files([source for *_, source in pending], on_result=on_result)
+        pending.clear()
+
+    for uploaded_file, slot in zip(uploaded_files, slots):
+        if slot is None:
+            errors.append(f"{uploaded_file.name}: Conversion did not complete")
+            continue
+        if isinstance(slot, str):
+            errors.append(slot)
+            continue
+        markdown_content, digest, markdown_key = slot
+        if len(markdown_content.strip()) < 10:
+            errors.append(f"{uploaded_file.name}: File appears to be empty or corrupted")
+            continue
+        converted_docs.append({
+            'filename': uploaded_file.name,
+            'content': markdown_content,
+            'size': uploaded_file.size,
+            'word_count': len(markdown_content.split()),
+            'content_hash': digest,
+            'markdown_key': markdown_key
+        })
+    report("Conversion complete!")
     return converted_docs, errors
 
 
@@ -227,22 +306,136 @@ def show_conversion_results(converted_docs, errors):
 
 
 # --- Enhanced Q&A with source ---
-def get_answer_with_source(collection, question):
-    results = collection.query(query_texts=[question], n_results=3)
+NO_ANSWER = "I don't have information about that topic in my Holistic Library."
+BUSY_ANSWER = "Our wellness guide is answering a lot of questions right now. Please try again in a moment. 🌿"
+
+
+# Retrieve context for a question; returns (prompt, best_source) or None
+# Fills `details` (when given) with per-question diagnostics such as the
+# rerank report
+def retrieve_context(collection, question, details=None):
+    hybrid = config.RETRIEVAL_MODE == "hybrid"
+    # Reranking looks at a wider candidate set and narrows it back down
+    keep = config.RERANK_CANDIDATES if config.RERANK else 3
+    n_results = max(keep, config.RETRIEVAL_CANDIDATES) if hybrid else keep
+    with span("query"):
+        results = collection.query(query_embeddings=[get_embedder().embed_query(question)],
+                                   n_results=n_results)
     docs = results["documents"][0]
     distances = results["distances"][0]
     ids = results["ids"][0] if "ids" in results else ["unknown"] * len(docs)
-    if not docs or min(distances) > 1.5:
-        return "I don't have information about that topic in my Holistic Library.", "No source"
-    context = "\n\n".join([f"Document {i+1}: {doc}" for i, doc in enumerate(docs)])
-    prompt = f"""Context information:\n{context}\n\nQuestion: {question}\n\nAnswer:"""
-    ai_model = pipeline("text2text-generation", model="google/flan-t5-small")
-    response = ai_model(prompt, max_length=150)
-    answer = response[0]['generated_text'].strip()
+    dense_match = bool(docs) and min(distances) <= 1.5
+    if hybrid:
+        # Exact terms (drug names, "150 minutes") can rank low on similarity
+        # alone, so fuse with BM25 and keep the best of the combined ranking
+        lexical_index = get_lexical_index(collection)
+        with span("lexical_query"):
+            lexical_ids = [chunk_id for chunk_id, _ in
+                           lexical_index.search(question, config.RETRIEVAL_CANDIDATES)]
+        if not dense_match:
+            # Without a dense match, sharing a common word or two is not
+            # enough; the chunk must contain most of what was asked
+            lexical_ids = [chunk_id for chunk_id in lexical_ids
+                           if lexical_index.coverage(question, chunk_id) >= config.BM25_MIN_COVERAGE]
+            if not lexical_ids:
+                return None
+        texts = dict(zip(ids, docs))
+        ids = reciprocal_rank_fusion([ids if dense_match else [], lexical_ids])[:keep]
+        missing = [chunk_id for chunk_id in ids if chunk_id not in texts]
+        if missing:
+            fetched = collection.get(ids=missing, include=["documents"])
+            texts.update(zip(fetched["ids"], fetched["documents"]))
+        ids = [chunk_id for chunk_id in ids if chunk_id in texts]
+        docs = [texts[chunk_id] for chunk_id in ids]
+    elif not dense_match:
+        return None
+    if config.RERANK:
+        with span("rerank"):
+            ids, docs, report = rerank(question, ids, docs)
+        if details is not None:
+            details['rerank'] = report
+    with span("prompt"):
+        prompt, packing = pack_context(question, docs)
+    logger.info("Prompt: %d tokens (%d context) from %d of %d chunk(s), %d overlapping chars removed%s",
+                packing['prompt_tokens'], packing['context_tokens'], packing['chunks'], len(docs),
+                packing['deduped_chars'], ", last one cut to fit" if packing['truncated'] else "")
+    if details is not None:
+        details['prompt'] = packing
     best_source = ids[0].split('_chunk_')[0] if ids else "unknown"
+    return prompt, best_source
+
+
+def generate_answer(prompt):
+    scheduler = get_scheduler()
+    if scheduler is not None:
+        # Shares a padded batch with other sessions' questions
+        with span("generate"):
+            return scheduler.generate(prompt, max_length=config.GENERATION_MAX_LENGTH)
+    ai_model = get_generator()
+    with span("generate"):
+        response = ai_model(prompt, max_length=config.GENERATION_MAX_LENGTH)
+    return response[0]['generated_text'].strip()
+
+
+def get_answer_with_source(collection, question):
+    cache = get_answer_cache(collection.name)
+    if cache is not None:
+        cached = cache.lookup(get_embedder().embed_query(question))
+        if cached is not None:
+            return cached
+    retrieved = retrieve_context(collection, question)
+    if retrieved is None:
+        return NO_ANSWER, "No source"
+    prompt, best_source = retrieved
+    try:
+        answer = generate_answer(prompt)
+    except SchedulerBusy:
+        return BUSY_ANSWER, best_source
+    if cache is not None:
+        cache.store(get_embedder().embed_query(question), answer, best_source)
     return answer, best_source
 
 
+# Streaming variant: the source is known once retrieval finishes, the answer
+# arrives as an iterator of text pieces
+def stream_answer_with_source(collection, question, details=None):
+    cache = get_answer_cache(collection.name)
+    if cache is not None:
+        cached = cache.lookup(get_embedder().embed_query(question))
+        if cached is not None:
+            return iter([cached[0]]), cached[1]
+    retrieved = retrieve_context(collection, question, details)
+    if retrieved is None:
+        return iter([NO_ANSWER]), "No source"
+    prompt, best_source = retrieved
+    pieces = _timed_generation(stream_generate(prompt, max_length=config.GENERATION_MAX_LENGTH))
+    if cache is None:
+        return pieces, best_source
+    return _cache_when_complete(pieces, cache, question, best_source), best_source
+
+
+def _timed_generation(pieces):
+    with span("generate"):
+        yield from pieces
+
+
+def _cache_when_complete(pieces, cache, question, source):
+    parts = []
+    for piece in pieces:
+        parts.append(piece)
+        yield piece
+    cache.store(get_embedder().embed_query(question), "".join(parts).strip(), source)
+
+
+# Pass pieces through while recording time to first token and total time
+def timed_stream(pieces, start, timings):
+    for piece in pieces:
+        if 'first_token' not in timings:
+            timings['first_token'] = time.perf_counter() - start
+        yield piece
+    timings['total'] = time.perf_counter() - start
+
+
 # --- Search history ---
 def add_to_search_history(question, answer, source):
     if 'search_history' not in st.session_state:
@@ -278,19 +471,20 @@ def show_document_manager():
         col1, col2, col3 = st.columns([3, 1, 1])
         with col1:
             st.write(f"📄 {doc['filename']}")
-            st.write(f"   Words: {len(doc['content'].split())}")
+            st.write(f"   Words: {doc['word_count']:,}")
         with col2:
             if st.button("🌿 Preview this Wisdom", key=f"preview_{i}"):
                 st.session_state[f'show_preview_{i}'] = True
         with col3:
             if st.button("🧘‍♂️ Release from My Library", key=f"delete_{i}"):
-                st.session_state.converted_docs.pop(i)
-                st.session_state.collection = reset_collection(chromadb.Client(), "documents")
-                add_docs_to_database(st.session_state.collection, st.session_state.converted_docs)
+                removed = st.session_state.converted_docs.pop(i)
+                entry = get_manifest().get(removed['filename'])
+                delete_document_from_chromadb(st.session_state.collection, removed['filename'],
+                                              entry["chunks"] if entry else None)
                 st.rerun()
         if st.session_state.get(f'show_preview_{i}', False):
             with st.expander(f"Preview: {doc['filename']}", expanded=True):
-                st.text(doc['content'][:500] + "..." if len(doc['content']) > 500 else doc['content'])
+                st.text(doc['preview'] + "..." if len(doc['preview']) >= PREVIEW_CHARS else doc['preview'])
                 if st.button("🌙 Hide Preview", key=f"hide_{i}"):
                     st.session_state[f'show_preview_{i}'] = False
                     st.rerun()
@@ -303,7 +497,7 @@ def show_document_stats():
         st.info("No documents to analyze yet. Add some wisdom to see your holistic stats! 🌼")
         return
     total_docs = len(st.session_state.converted_docs)
-    total_words = sum(len(doc['content'].split()) for doc in st.session_state.converted_docs)
+    total_words = sum(doc['word_count'] for doc in st.session_state.converted_docs)
     avg_words = total_words // total_docs if total_docs > 0 else 0
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -314,18 +508,234 @@ def show_document_stats():
         st.metric("Average Words/Doc", f"{avg_words:,}")
     file_types = {}
     for doc in st.session_state.converted_docs:
-        ext = Path(doc['filename']).suffix.lower()
-        file_types[ext] = file_types.get(ext, 0) + 1
+        file_types[doc['file_type']] = file_types.get(doc['file_type'], 0) + 1
     st.write("**File Types in Your Wellness Library:**")
     for ext, count in file_types.items():
         st.write(f"• {ext}: {count} file{'s' if count > 1 else ''}")
 
 
+# --- Model load and cache statistics ---
+def show_model_stats():
+    stats = model_stats()
+    if stats:
+        st.write("**Models Loaded in This Server:**")
+        for entry in stats:
+            st.write(f"• {entry['model']}: loaded in {entry['load_seconds']:.2f}s, "
+                     f"+{entry['rss_delta_mb']:,.0f} MB (process {entry['rss_mb']:,.0f} MB)")
+    answer_cache = get_answer_cache()
+    if answer_cache is not None:
+        answer_stats = answer_cache.stats()
+        st.write(f"**Answer Cache:** {answer_stats['hits']} hits, {answer_stats['misses']} misses "
+                 f"({answer_stats['hit_rate']:.0%}), {answer_stats['entries']} answers kept")
+    if config.RERANK:
+        rerank_info = rerank_stats()
+        st.write(f"**Reranking:** {rerank_info['reranked']} queries reranked "
+                 f"(avg {rerank_info['avg_ms']:.0f} ms), {rerank_info['skipped']} skipped over budget")
+    scheduler = get_scheduler()
+    if scheduler is not None:
+        batching = scheduler.stats()
+        st.write(f"**Answer Batching:** {batching['requests']} answers in {batching['batches']} batches "
+                 f"(avg {batching['mean_batch_size']:.1f}, waited {batching['mean_wait_ms']:.0f} ms), "
+                 f"{batching['queue_depth']} waiting now (peak {batching['max_queue_depth']}), "
+                 f"{batching['rejected']} turned away")
+    query_stats = get_embedder().cache_stats()
+    st.write(f"**Question Embedding Cache:** {query_stats['hits']} hits, "
+             f"{query_stats['misses']} misses ({query_stats['hit_rate']:.0%})")
+    cache_stats = get_markdown_store().stats()
+    st.write(f"**Conversion Cache:** {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+             f"({cache_stats['hit_rate']:.0%}), {cache_stats['entries']} files "
+             f"({cache_stats['pinned']} in your library), "
+             f"{cache_stats['bytes'] / (1024 * 1024):,.1f} MB")
+
+
+# --- Warm-up ---
+# Load the models, converters and BM25 index ahead of the
+# first upload or question
+def warm_up_everything(collection):
+    start = time.perf_counter()
+    warm_up()
+    warm_up_converters()
+    if config.RETRIEVAL_MODE == "hybrid":
+        get_lexical_index(collection)
+    logger.info("Warm-up finished in %.1fs", time.perf_counter() - start)
+
+
+_warm_up_lock = threading.Lock()
+
+
+# Run the warm-up once per process on a daemon thread, so the page renders
+# straight away; whatever a request needs first still loads on demand
+def start_warm_up(collection):
+    with _warm_up_lock:
+        if getattr(start_warm_up, 'thread', None) is None:
+            start_warm_up.thread = threading.Thread(target=warm_up_everything, args=(collection,),
+                                                    name="holistica-warm-up", daemon=True)
+            start_warm_up.thread.start()
+    return start_warm_up.thread
+
+
+# --- Per-stage timings ---
+def show_performance_panel():
+    st.subheader("⏱️ Where the Time Goes")
+    rows = metrics.snapshot()
+    if not rows:
+        st.info("No timings yet. Upload a document or ask a question to see each stage. 🌿")
+        return
+    columns = ("stage", "count", "mean_ms", "p50_ms", "p95_ms", "max_ms")
+    st.dataframe([{column: row[column] for column in columns} for row in rows], hide_index=True)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("Export JSON lines", metrics.to_jsonl(),
+                           file_name="holistica_timings.jsonl", mime="application/x-ndjson")
+    with col2:
+        st.download_button("Export Prometheus text", metrics.to_prometheus(),
+                           file_name="holistica_timings.prom", mime="text/plain")
+
+
 # --- Helper: Add docs to ChromaDB ---
-def add_docs_to_database(collection, docs):
-    for doc in docs:
+# Documents whose content hash is already indexed under the same filename are
+# skipped; changed documents have their old chunks replaced.
+def add_docs_to_database(collection, docs, progress=None):
+    manifest = get_manifest()
+    total_chunks = 0
+    reused = 0
+    start = time.perf_counter()
+    for position, doc in enumerate(docs, 1):
+        digest = doc.get('content_hash') or content_hash(doc['content'].encode("utf-8"))
+        if manifest.is_indexed(doc['filename'], digest):
+            reused += 1
+            continue
+        previous = manifest.get(doc['filename'])
+        if previous is not None:
+            delete_document_from_chromadb(collection, doc['filename'], previous["chunks"])
         add_text_to_chromadb(doc['content'], doc['filename'], collection_name="documents")
-    return len(docs)
+        chunks = add_text_to_chromadb.last_stats["chunks"]
+        markdown_key = doc.get('markdown_key') or MarkdownCache.key(doc['content'].encode("utf-8"), "markdown")
+        manifest.record(doc['filename'], digest, markdown_key, doc['content'], doc.get('size', 0), chunks)
+        total_chunks += chunks
+        if progress:
+            progress(position, len(docs))
+    elapsed = time.perf_counter() - start
+    add_docs_to_database.last_stats = {
+        "docs": len(docs),
+        "reused": reused,
+        "chunks": total_chunks,
+        "seconds": elapsed,
+        "chunks_per_sec": total_chunks / elapsed if elapsed > 0 else 0.0,
+    }
+    return len(docs) - reused
+
+
+# --- Background uploads ---
+# Runs on the job queue's worker thread: conversion is the first half of the
+# progress bar, indexing the second
+def ingest_uploads(job_id, uploads):
+    jobs = get_job_queue()
+
+    def report(message, fraction=None):
+        if fraction is None:
+            jobs.update(job_id, message=message)
+        else:
+            jobs.update(job_id, message=message, progress=0.5 * fraction)
+
+    jobs.update(job_id, status="converting", message=f"Converting {len(uploads)} file(s)...")
+    converted_docs, errors = safe_convert_files(uploads, report=report)
+    stats = None
+    if converted_docs:
+        jobs.update(job_id, status="indexing", progress=0.5,
+                    message=f"Indexing {len(converted_docs)} document(s)...")
+        collection = get_client().get_or_create_collection(name="documents")
+        add_docs_to_database(collection, converted_docs, progress=lambda done, total: jobs.update(
+            job_id, progress=0.5 + 0.5 * done / total, message=f"Indexed {done} of {total} document(s)"))
+        stats = add_docs_to_database.last_stats
+    return library_handles(converted_docs), errors, stats
+
+
+# Session library entries for freshly indexed documents
+def library_handles(docs):
+    manifest = get_manifest()
+    return [h for h in (manifest.handle(doc['filename']) for doc in docs) if h is not None]
+
+
+# Add a finished job's documents to this session's library (once)
+def merge_job_results(job_id):
+    docs = get_job_queue().take_results(job_id)
+    if not docs:
+        return
+    library = {d['filename']: j for j, d in enumerate(st.session_state.converted_docs)}
+    for doc in docs:
+        if doc['filename'] in library:
+            st.session_state.converted_docs[library[doc['filename']]] = doc
+        else:
+            st.session_state.converted_docs.append(doc)
+
+
+def _show_upload_jobs():
+    jobs = get_job_queue()
+    for job_id in reversed(st.session_state.upload_jobs):
+        job = jobs.get(job_id)
+        if job is None:
+            continue
+        files = ", ".join(job['files'][:3]) + (f" and {len(job['files']) - 3} more" if len(job['files']) > 3 else "")
+        if job['status'] in ACTIVE_JOB_STATES:
+            st.progress(job['progress'], text=f"{files}: {job['message']}")
+            continue
+        if job_id not in st.session_state.merged_jobs:
+            st.session_state.merged_jobs.add(job_id)
+            merge_job_results(job_id)
+            # Refresh the whole page so the library and Q&A tabs see the new documents
+            st.rerun()
+        if job['status'] == "done":
+            st.success(f"🌼 {files}: {job['message']}")
+            ingest = job['stats']
+            if ingest:
+                st.caption(f"Indexed {ingest['chunks']:,} passages in {ingest['seconds']:.1f}s "
+                           f"({ingest['chunks_per_sec']:,.0f} chunks/sec); "
+                           f"{ingest['reused']} unchanged document(s) reused")
+            for error in job['errors']:
+                st.write(f"• {error}")
+        else:
+            st.error(f"❌ {files}: {job['message']}")
+
+
+# Progress of this session's uploads; re-polled every JOB_POLL_SECONDS while
+# any of them is still running, without re-running the rest of the page
+def show_upload_jobs():
+    if not st.session_state.upload_jobs:
+        return
+    jobs = get_job_queue()
+    running = any((jobs.get(job_id) or {}).get('status') in ACTIVE_JOB_STATES
+                  for job_id in st.session_state.upload_jobs)
+    if running and hasattr(st, "fragment"):
+        st.fragment(_show_upload_jobs, run_every=config.JOB_POLL_SECONDS)()
+    else:
+        _show_upload_jobs()
+        if running and st.button("🔄 Check progress"):
+            st.rerun()
+
+
+# --- Helper: Rebuild the index after an embedding model change ---
+# Vectors from another model can't be compared with new query embeddings, so
+# the stored markdown is re-embedded once (no conversion needed)
+def reindex_if_model_changed():
+    manifest = get_manifest()
+    if not manifest.needs_rebuild():
+        return 0
+    handles = manifest.handles()
+    logger.info("Embedding model changed to %s; re-indexing %d document(s)",
+                config.EMBEDDING_MODEL, len(handles))
+    collection = reset_collection(get_client(), "documents")
+    store = get_markdown_store()
+    reindexed = 0
+    # One document's markdown in memory at a time
+    for handle in handles:
+        content = store.get(handle['markdown_key'])
+        if content is None:
+            logger.warning("Markdown for %s is missing; it needs to be uploaded again", handle['filename'])
+            continue
+        add_docs_to_database(collection, [dict(handle, content=content)])
+        reindexed += 1
+    return reindexed
 
 
 # --- Main holistic app ---
@@ -352,17 +762,27 @@ def holistic_main():
         unsafe_allow_html=True
     )
     # Session state
+    if not getattr(reindex_if_model_changed, 'done', False):
+        with st.spinner("Refreshing your library for the new search model..."):
+            reindex_if_model_changed()
+        reindex_if_model_changed.done = True
     if 'converted_docs' not in st.session_state:
-        st.session_state.converted_docs = []
+        # Start from whatever is already indexed in the persistent store. The
+        # session only keeps handles; markdown lives in the shared store.
+        st.session_state.converted_docs = get_manifest().handles()
+        st.session_state.restored_library = get_manifest().summary()
     if 'collection' not in st.session_state:
-        # Use get_or_create pattern to avoid duplicate collection error
-        client = chromadb.Client()
-        try:
-            st.session_state.collection = client.get_collection(name="documents")
-        except Exception:
-            st.session_state.collection = client.create_collection(name="documents")
+        st.session_state.collection = get_client().get_or_create_collection(name="documents")
     if 'search_history' not in st.session_state:
         st.session_state.search_history = []
+    if 'upload_jobs' not in st.session_state:
+        st.session_state.upload_jobs = []
+        st.session_state.merged_jobs = set()
+    if config.WARMUP_MODELS and config.WARMUP_BACKGROUND:
+        start_warm_up(st.session_state.collection)
+    elif config.WARMUP_MODELS and not model_stats():
+        with st.spinner("Warming up our wellness guide..."):
+            warm_up_everything(st.session_state.collection)
     # Tabs
     tab1, tab2, tab3, tab4 = st.tabs([
         "🌱 Upload Wellness Wisdom",
@@ -372,24 +792,73 @@ def holistic_main():
     ])
     with tab1:
         st.header("Upload & Convert Your Wellness Documents")
+        restored = st.session_state.get('restored_library')
+        if restored and restored['documents']:
+            st.caption(f"Restored {restored['documents']} document(s) "
+                       f"({restored['chunks']:,} passages) from your saved library.")
         uploaded_files = st.file_uploader(
             "Bring your knowledge into our cozy space (PDF, DOC, DOCX, TXT)",
             type=["pdf", "doc", "docx", "txt"],
             accept_multiple_files=True
         )
         if st.button("✨ Add to My Holistic Library ✨"):
-            if uploaded_files:
+            if uploaded_files and config.BACKGROUND_INGEST:
+                # Hand the work to the job queue; questions keep working while it runs
+                uploads = [Upload(f.name, f.getvalue()) for f in uploaded_files]
+                st.session_state.upload_jobs.append(get_job_queue().submit(uploads, ingest_uploads))
+            elif uploaded_files:
                 converted_docs, errors = safe_convert_files(uploaded_files)
                 if converted_docs:
                     num_added = add_docs_to_database(st.session_state.collection, converted_docs)
-                    st.session_state.converted_docs.extend(converted_docs)
+                    library = {d['filename']: j for j, d in enumerate(st.session_state.converted_docs)}
+                    for doc in library_handles(converted_docs):
+                        if doc['filename'] in library:
+                            st.session_state.converted_docs[library[doc['filename']]] = doc
+                        else:
+                            st.session_state.converted_docs.append(doc)
+                    ingest = add_docs_to_database.last_stats
+                    st.caption(f"Indexed {ingest['chunks']:,} passages in {ingest['seconds']:.1f}s "
+                               f"({ingest['chunks_per_sec']:,.0f} chunks/sec); "
+                               f"{ingest['reused']} unchanged document(s) reused")
                 show_conversion_results(converted_docs, errors)
+        show_upload_jobs()
     with tab2:
         st.header("Ask a Gentle Question")
         if st.session_state.get('converted_docs'):
             question = st.text_input("What would you like to explore on your wellness journey today?")
             if st.button("🌸 Find My Holistic Answer 🌸"):
-                if question:
+                if question and config.STREAM_ANSWERS:
+                    start = time.perf_counter()
+                    details = {}
+                    pieces, source = stream_answer_with_source(st.session_state.collection, question,
+                                                               details)
+                    retrieval_time = time.perf_counter() - start
+                    st.write(f"**Source:** {source}")
+                    st.write("**Answer:**")
+                    timings = {}
+                    try:
+                        answer = st.write_stream(timed_stream(pieces, start, timings)).strip()
+                    except Exception as e:
+                        logger.exception("Answer generation failed")
+                        st.error(f"Sorry, I couldn't finish that answer: {e}")
+                    else:
+                        caption = (f"Found sources in {retrieval_time:.2f}s • first words after "
+                                   f"{timings.get('first_token', timings['total']):.2f}s • "
+                                   f"complete in {timings['total']:.2f}s")
+                        rerank_report = details.get('rerank')
+                        if rerank_report and rerank_report['reranked']:
+                            caption += (f" • reranked {rerank_report['pairs']} passages "
+                                        f"in {rerank_report['ms']:.0f} ms")
+                        elif rerank_report and 'estimated_ms' in rerank_report:
+                            caption += (f" • rerank skipped (~{rerank_report['estimated_ms']:.0f} ms "
+                                        f"over budget)")
+                        packing = details.get('prompt')
+                        if packing:
+                            caption += (f" • {packing['prompt_tokens']}/{packing['max_tokens']} "
+                                        f"prompt tokens")
+                        st.caption(caption)
+                        add_to_search_history(question, answer, source)
+                elif question:
                     answer, source = get_answer_with_source(st.session_state.collection, question)
                     st.write("**Answer:**")
                     st.write(answer)
@@ -404,6 +873,8 @@ def holistic_main():
     with tab4:
         st.header("Holistic Insights & Balance")
         show_document_stats()
+        show_performance_panel()
+        show_model_stats()
     st.markdown("---")
     st.markdown("*Built with Streamlit • Powered by AI*")
 
@@ -418,7 +889,7 @@ def main():
         accept_multiple_files=True
     )
 
-    client = chromadb.Client()
+    client = get_client()
 
     if st.button("Chunk and Store Documents"):
         if uploaded_files:
@@ -0,0 +1,103 @@
+import threading
+import time
+
+import numpy as np
+
+import config
+
+
+class SemanticAnswerCache:
+    """Answers keyed by question embedding, matched by cosine similarity.
+
+    Entries expire after `ttl` seconds; past `max_entries` the least recently
+    used entry is dropped. `clear()` is called whenever the library changes.
+    """
+
+    def __init__(self, threshold, max_entries, ttl):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        # parallel to the rows of _vectors: [answer, source, created, last_used]
+        self._entries = []
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _drop(self, rows):
+        keep = [i for i in range(len(self._entries)) if i not in rows]
+        self._vectors = self._vectors[keep]
+        self._entries = [self._entries[i] for i in keep]
+
+    def lookup(self, query_vector):
+        now = time.monotonic()
+        with self._lock:
+            expired = {i for i, entry in enumerate(self._entries) if now - entry[2] > self.ttl}
+            if expired:
+                self._drop(expired)
+            if self._entries:
+                scores = self._vectors @ self._unit(query_vector)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.hits += 1
+                    self._entries[best][3] = now
+                    return self._entries[best][0], self._entries[best][1]
+            self.misses += 1
+            return None
+
+    def store(self, query_vector, answer, source):
+        if self.max_entries <= 0:
+            return
+        now = time.monotonic()
+        vector = self._unit(query_vector)[np.newaxis, :]
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                oldest = min(range(len(self._entries)), key=lambda i: self._entries[i][3])
+                self._drop({oldest})
+            self._vectors = vector if not self._entries else np.vstack([self._vectors, vector])
+            self._entries.append([answer, source, now, now])
+
+    def clear(self):
+        with self._lock:
+            self._vectors = np.empty((0, 0), dtype=np.float32)
+            self._entries = []
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+_caches = {}
+_lock = threading.Lock()
+
+
+# One cache per collection, or None when HOLISTICA_ANSWER_CACHE is off
+def get_answer_cache(collection_name: str = "documents"):
+    if not config.ANSWER_CACHE:
+        return None
+    cache = _caches.get(collection_name)
+    if cache is None:
+        with _lock:
+            cache = _caches.get(collection_name)
+            if cache is None:
+                cache = _caches[collection_name] = SemanticAnswerCache(
+                    config.ANSWER_CACHE_THRESHOLD, config.ANSWER_CACHE_SIZE, config.ANSWER_CACHE_TTL
+                )
+    return cache
+
+
+def invalidate(collection_name: str = "documents"):
+    cache = _caches.get(collection_name)
+    if cache is not None:
+        cache.clear()
@@ -0,0 +1,349 @@
+"""Headless benchmark of the Final.py ingestion and question-answering path.
+
+Runs convert_to_markdown -> splitter -> add_text_to_chromadb ->
+retrieve_context/generate_answer (the uncached body of get_answer_with_source)
+over a synthetic corpus, or a folder of real documents, and writes a JSON
+report with throughput, latency percentiles and peak RSS. The synthetic
+corpus is plain text, so docling conversion is only exercised with --corpus.
+
+    python benchmark.py --docs 50 --questions 100 --out bench.json
+    python benchmark.py --corpus ./my_pdfs --real-models
+    python benchmark.py --imports
+    python benchmark.py --compare-embeddings
+
+--imports instead reports how long `import Final` takes in a fresh
+interpreter (everything before the first Streamlit call) and which
+top-level imports account for it. --compare-embeddings encodes chunks of
+the synthetic corpus with every embedding backend and reports throughput
+and cosine drift against the stock PyTorch model (this one may download
+the ONNX files).
+
+Network access is disabled; --real-models needs the models already in the
+local Hugging Face cache, otherwise lightweight stand-ins are used.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+_TOPICS = [
+    "sleep", "nutrition", "exercise", "meditation", "stress", "hydration", "journaling",
+    "breathing", "posture", "gratitude", "friendship", "nature", "sunlight", "yoga",
+]
+_WORDS = (
+    "balance energy calm routine habit focus recovery mindful gentle daily practice body "
+    "mind heart community rest movement wellbeing clarity resilience support growth "
+    "connection purpose reflection nourishing kindness patience strength awareness"
+).split()
+
+
+# --- Offline stand-ins for the real models ---
+class StubEmbedder:
+    """Deterministic hashed bag-of-words vectors with the MiniLM dimension."""
+
+    dim = 384
+
+    def _vector(self, text):
+        import numpy as np
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in text.lower().split():
+            vector[int(hashlib.md5(token.encode()).hexdigest(), 16) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts, batch_size=None, **kwargs):
+        import numpy as np
+        if isinstance(texts, str):
+            return self._vector(texts)
+        return np.stack([self._vector(text) for text in texts]) if texts else np.zeros((0, self.dim))
+
+
+class StubGenerator:
+    """Returns the first sentence of the context, like a very terse flan-t5."""
+
+    def __call__(self, prompt, max_length=None, **kwargs):
+        if isinstance(prompt, list):
+            return [self(p, max_length)[0] for p in prompt]
+        context = prompt.split("Document 1:", 1)[-1]
+        return [{"generated_text": context.split(".", 1)[0][: max_length or 150]}]
+
+
+# --- Corpus ---
+def synthetic_corpus(num_docs, words_per_doc, seed):
+    rng = random.Random(seed)
+    docs, facts = [], []
+    for d in range(num_docs):
+        topic = _TOPICS[d % len(_TOPICS)]
+        sentences = []
+        while sum(len(s.split()) for s in sentences) < words_per_doc:
+            if rng.random() < 0.1:
+                minutes = rng.randint(5, 300)
+                fact = f"Guide {d} recommends {minutes} minutes of {topic} each week"
+                facts.append((f"How many minutes of {topic} does guide {d} recommend?", fact))
+                sentences.append(fact + ".")
+            else:
+                sentences.append(" ".join(rng.choices(_WORDS, k=rng.randint(8, 20))).capitalize() + ".")
+        docs.append((f"guide_{d:04d}_{topic}.txt", "\n\n".join(
+            " ".join(sentences[i:i + 5]) for i in range(0, len(sentences), 5)
+        )))
+    return docs, facts
+
+
+def percentiles(samples):
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+    return {
+        "p50": rank(50) * 1000,
+        "p95": rank(95) * 1000,
+        "p99": rank(99) * 1000,
+        "mean": sum(ordered) / len(ordered) * 1000,
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# Parse `python -X importtime -c "import <module>"`: total seconds and the
+# slowest direct imports
+def import_report(module="Final", top=10):
+    env = dict(os.environ, HOLISTICA_WARMUP_MODELS="0")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, cwd=Path(__file__).resolve().parent,
+                            env=env, check=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        depth = (len(line.rsplit("|", 1)[1]) - len(line.rsplit("|", 1)[1].lstrip()) - 1) // 2
+        imports.append((name, int(cumulative), depth))
+    # Children are listed before their parent, one level deeper
+    end = next(i for i, (name, _, depth) in enumerate(imports) if name == module and depth == 0)
+    total_us = imports[end][1]
+    direct = []
+    for name, us, depth in reversed(imports[:end]):
+        if depth == 0:
+            break
+        if depth == 1:
+            direct.append((name, us))
+    direct.sort(key=lambda item: item[1], reverse=True)
+    return {
+        "module": module,
+        "import_seconds": total_us / 1e6,
+        "slowest": [{"module": name, "ms": us / 1000} for name, us in direct[:top]],
+    }
+
+
+def compare_embeddings(args):
+    from chunking import iter_chunks
+    from embeddings import compare_backends
+
+    docs, _ = synthetic_corpus(args.docs, args.words_per_doc, args.seed)
+    texts = [chunk for _, text in docs for chunk in iter_chunks(text)][:args.chunks]
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "cpus": os.cpu_count(),
+        "texts": len(texts),
+        "backends": compare_backends(texts),
+    }
+
+
+def run(args):
+    with tempfile.TemporaryDirectory(prefix="holistica-bench-") as workdir:
+        return _run(args, Path(workdir))
+
+
+def _run(args, workdir):
+    # Isolated, throwaway store; no downloads; caches off so every question
+    # measures real retrieval and generation
+    os.environ["HOLISTICA_PERSIST_STORE"] = "0"
+    os.environ["HOLISTICA_STORE_DIR"] = str(workdir / "store")
+    os.environ["HOLISTICA_MARKDOWN_CACHE"] = "0"
+    os.environ["HOLISTICA_ANSWER_CACHE"] = "0"
+    os.environ["HOLISTICA_QUERY_CACHE_SIZE"] = "0"
+    os.environ["HOLISTICA_WARMUP_MODELS"] = "0"
+    if not args.real_models:
+        # There is no stand-in cross-encoder, so reranking needs real models
+        os.environ["HOLISTICA_RERANK"] = "0"
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+    import config
+    import metrics
+    import model_registry
+    import Final
+
+    if not args.real_models:
+        model_registry.set_embedding_model(StubEmbedder())
+        model_registry.set_generator(StubGenerator())
+
+    if args.corpus:
+        files = sorted(p for p in Path(args.corpus).rglob("*")
+                       if p.suffix.lower() in (".pdf", ".doc", ".docx", ".txt"))
+        facts = []
+    else:
+        docs, facts = synthetic_corpus(args.docs, args.words_per_doc, args.seed)
+        corpus_dir = workdir / "corpus"
+        corpus_dir.mkdir()
+        files = []
+        for name, text in docs:
+            path = corpus_dir / name
+            path.write_text(text, encoding="utf-8")
+            files.append(path)
+
+    collection_name = "benchmark"
+    collection = Final.reset_collection(Final.get_client(), collection_name)
+    model_registry.get_embedding_model()
+    model_registry.get_generator()
+
+    # Ingestion
+    convert_seconds = index_seconds = 0.0
+    chunks = 0
+    texts = []
+    for path in files:
+        start = time.perf_counter()
+        text = Final.convert_to_markdown(str(path))
+        convert_seconds += time.perf_counter() - start
+        texts.append(text)
+        start = time.perf_counter()
+        Final.add_text_to_chromadb(text, path.name, collection_name=collection_name)
+        index_seconds += time.perf_counter() - start
+        chunks += Final.add_text_to_chromadb.last_stats["chunks"]
+
+    # Questions: the planted facts, or sentences from the documents themselves
+    rng = random.Random(args.seed)
+    if facts:
+        questions = [q for q, _ in rng.sample(facts, min(args.questions, len(facts)))]
+    else:
+        sentences = [s.strip() for t in texts for s in t.split(".") if len(s.split()) > 5]
+        questions = rng.sample(sentences, min(args.questions, len(sentences)))
+    retrieval, generation, answered = [], [], 0
+    for question in questions:
+        start = time.perf_counter()
+        retrieved = Final.retrieve_context(collection, question)
+        retrieval.append(time.perf_counter() - start)
+        if retrieved is None:
+            continue
+        start = time.perf_counter()
+        Final.generate_answer(retrieved[0])
+        generation.append(time.perf_counter() - start)
+        answered += 1
+
+    ingest_seconds = convert_seconds + index_seconds
+    # Plain text skips docling entirely, so conversion is only measured when
+    # the corpus contains PDF or Word files
+    converted_with_docling = sum(1 for p in files if p.suffix.lower() != ".txt")
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "models": "real" if args.real_models else "stub",
+        "settings": {
+            "embedding_model": config.EMBEDDING_MODEL,
+            "generation_model": config.GENERATION_MODEL,
+            "embed_batch_size": config.EMBED_BATCH_SIZE,
+            "insert_batch_size": config.INSERT_BATCH_SIZE,
+            "retrieval_mode": config.RETRIEVAL_MODE,
+            "rerank": config.RERANK,
+        },
+        "corpus": {
+            "source": args.corpus or "synthetic",
+            "documents": len(files),
+            "chunks": chunks,
+            "characters": sum(len(t) for t in texts),
+            "docling_files": converted_with_docling,
+        },
+        "ingestion": {
+            "conversion_measured": converted_with_docling > 0,
+            "convert_seconds": convert_seconds,
+            "index_seconds": index_seconds,
+            "docs_per_sec": len(files) / ingest_seconds if ingest_seconds else 0.0,
+            "chunks_per_sec": chunks / index_seconds if index_seconds else 0.0,
+        },
+        "queries": {
+            "asked": len(questions),
+            "answered": answered,
+            "retrieval_ms": percentiles(retrieval),
+            "generation_ms": percentiles(generation),
+        },
+        "stages": {row["stage"]: {key: row[key] for key in ("count", "mean_ms", "p50_ms", "p95_ms", "max_ms")}
+                   for row in metrics.snapshot()},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=20, help="synthetic documents to generate")
+    parser.add_argument("--words-per-doc", type=int, default=2000)
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--corpus", help="folder of PDF/DOC/DOCX/TXT files instead of synthetic text")
+    parser.add_argument("--real-models", action="store_true",
+                        help="use the configured models from the local cache instead of stand-ins")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--imports", action="store_true",
+                        help="only measure the import time of Final.py")
+    parser.add_argument("--compare-embeddings", action="store_true",
+                        help="only compare the embedding backends' speed and drift")
+    parser.add_argument("--chunks", type=int, default=512,
+                        help="chunks to encode with --compare-embeddings")
+    parser.add_argument("--out", default="benchmark_results.json")
+    args = parser.parse_args(argv)
+
+    if args.compare_embeddings:
+        report = compare_embeddings(args)
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"{report['texts']} chunks on {report['cpus']} CPUs")
+        for backend, entry in report["backends"].items():
+            if "error" in entry:
+                print(f"{backend:>11}: unavailable ({entry['error']})")
+            elif "speedup" in entry:
+                print(f"{backend:>11}: {entry['texts_per_sec']:.0f} chunks/s ({entry['speedup']:.2f}x), "
+                      f"cosine to reference mean {entry['mean_cosine']:.4f} min {entry['min_cosine']:.4f}")
+            else:
+                print(f"{backend:>11}: {entry['texts_per_sec']:.0f} chunks/s (reference)")
+        return
+
+    if args.imports:
+        report = import_report()
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"import {report['module']}: {report['import_seconds'] * 1000:.0f} ms")
+        for entry in report["slowest"]:
+            print(f"{entry['ms']:>10.1f} ms  {entry['module']}")
+        return
+
+    results = run(args)
+    Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    ingestion, queries = results["ingestion"], results["queries"]
+    print(f"{results['corpus']['documents']} docs, {results['corpus']['chunks']} chunks: "
+          f"{ingestion['docs_per_sec']:.1f} docs/s, {ingestion['chunks_per_sec']:.0f} chunks/s")
+    for stage in ("retrieval_ms", "generation_ms"):
+        p = queries[stage]
+        if p["p50"] is not None:
+            print(f"{stage[:-3]:>10}: p50 {p['p50']:.1f} ms  p95 {p['p95']:.1f} ms  p99 {p['p99']:.1f} ms")
+    if not ingestion["conversion_measured"]:
+        print("note: corpus is plain text only, docling conversion was not measured "
+              "(use --corpus with PDF/DOCX files)")
+    print(f"peak RSS {results['peak_rss_mb']:.0f} MB -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+
+import config
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.'-][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from how i in is it its of on or "
+    "so that the their them there these they this to was what when where which who "
+    "why will with you your".split()
+)
+
+
+def tokenize(text: str):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class _TermList:
+    """One term's postings, ordered by impact for top-k search.
+
+    `impacts` is the BM25 term-frequency part of the score (idf is applied per
+    query), computed against the average chunk length at build time.
+    """
+
+    def __init__(self, postings, lengths, avg_length, k1, b):
+        slots = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+        tfs = np.fromiter(postings.values(), dtype=np.float64, count=len(postings))
+        impacts = tfs * (k1 + 1) / (tfs + k1 * (1 - b + b * lengths[slots] / avg_length))
+        order = np.argsort(-impacts, kind="stable")
+        self.slots = slots[order]
+        self.impacts = impacts[order]
+        by_slot = np.argsort(slots)
+        self.sorted_slots = slots[by_slot]
+        self.sorted_impacts = impacts[by_slot]
+        self.avg_length = avg_length
+
+    def __len__(self):
+        return len(self.slots)
+
+    # Impact of this term for each slot, 0 where the term does not occur
+    def lookup(self, slots):
+        pos = np.searchsorted(self.sorted_slots, slots)
+        pos[pos == len(self.sorted_slots)] = 0
+        found = self.sorted_slots[pos] == slots
+        return np.where(found, self.sorted_impacts[pos], 0.0)
+
+
+class BM25Index:
+    """In-process inverted index scored with Okapi BM25.
+
+    Postings are updated per chunk on add/remove, so the index never needs a
+    full rebuild. Each queried term keeps an impact-ordered array of its
+    postings (rebuilt only after that term changes or the average chunk
+    length drifts by more than 2%), and search reads those arrays from the
+    top down, stopping as soon as no unread chunk can reach the top k.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)  # term -> {slot: term frequency}
+        self._term_lists = {}               # term -> _TermList cache
+        self._slots = {}                    # chunk_id -> slot
+        self._ids = []                      # slot -> chunk_id (None once removed)
+        self._lengths = np.zeros(1024)      # slot -> token count
+        self._terms = {}                    # chunk_id -> its distinct terms
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def add(self, ids, texts):
+        with self._lock:
+            for chunk_id, text in zip(ids, texts):
+                if chunk_id in self._slots:
+                    self._remove_one(chunk_id)
+                counts = Counter(tokenize(text))
+                slot = len(self._ids)
+                self._ids.append(chunk_id)
+                if slot >= len(self._lengths):
+                    self._lengths = np.concatenate([self._lengths, np.zeros(len(self._lengths))])
+                for term, tf in counts.items():
+                    self._postings[term][slot] = tf
+                    self._term_lists.pop(term, None)
+                length = sum(counts.values())
+                self._slots[chunk_id] = slot
+                self._lengths[slot] = length
+                self._terms[chunk_id] = tuple(counts)
+                self._total_length += length
+
+    def _remove_one(self, chunk_id):
+        slot = self._slots.pop(chunk_id, None)
+        if slot is None:
+            return
+        for term in self._terms.pop(chunk_id, ()):
+            self._term_lists.pop(term, None)
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(slot, None)
+                if not postings:
+                    del self._postings[term]
+        self._ids[slot] = None
+        self._total_length -= self._lengths[slot]
+        self._lengths[slot] = 0
+
+    def remove(self, ids):
+        with self._lock:
+            for chunk_id in ids:
+                self._remove_one(chunk_id)
+
+    def _idf(self, n, df):
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    # Impact-ordered postings and idf for each known query term
+    def _query_terms(self, query):
+        with self._lock:
+            n = len(self._slots)
+            if not n:
+                return n, []
+            avg_length = self._total_length / n or 1.0
+            terms = []
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                term_list = self._term_lists.get(term)
+                if term_list is None or abs(term_list.avg_length - avg_length) > 0.02 * avg_length:
+                    term_list = _TermList(postings, self._lengths, avg_length, self.k1, self.b)
+                    self._term_lists[term] = term_list
+                terms.append((self._idf(n, len(postings)), term_list))
+            return n, terms
+
+    def search(self, query: str, k: int = 10):
+        n, terms = self._query_terms(query)
+        if not terms or k <= 0:
+            return []
+        # Terms are read in order of the most they can add to a score; once the
+        # current k-th score beats the combined maximum of the weakest terms,
+        # those are only looked up for candidates, never scanned (MaxScore)
+        terms.sort(key=lambda term: term[0] * term[1].impacts[0])
+        essential, slack, threshold = terms, 0.0, 0.0
+        depth = max(4 * k, 64)
+        while depth * 16 < max(len(t) for _, t in essential):
+            candidates = np.unique(np.concatenate([t.slots[:depth] for _, t in essential]))
+            scores = np.zeros(len(candidates))
+            for idf, term_list in terms:
+                scores += idf * term_list.lookup(candidates)
+            # Best score a chunk that is not a candidate could have
+            bound = slack + sum(idf * t.impacts[depth] for idf, t in essential if depth < len(t))
+            top = min(k, len(candidates))
+            best = np.argpartition(-scores, top - 1)[:top]
+            if top == k:
+                threshold = max(threshold, scores[best].min())
+                if threshold >= bound:
+                    break
+                while len(essential) > 1:
+                    upper = essential[0][0] * essential[0][1].impacts[0]
+                    if slack + upper >= threshold:
+                        break
+                    slack += upper
+                    essential = essential[1:]
+            depth *= 4
+        else:
+            # Deep enough that a single dense pass over every posting is cheaper
+            scores = np.zeros(len(self._ids))
+            for idf, term_list in terms:
+                scores[term_list.slots] += idf * term_list.impacts
+            candidates = np.flatnonzero(scores)
+            scores = scores[candidates]
+            top = min(k, len(candidates))
+            best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        ids = self._ids
+        return [(ids[slot], float(score)) for slot, score in zip(candidates[best], scores[best])
+                if ids[slot] is not None]
+
+    # Share of the query's idf weight found in a chunk; terms the library has
+    # never seen count fully, so off-topic questions score low
+    def coverage(self, query: str, chunk_id) -> float:
+        with self._lock:
+            n = len(self._slots)
+            chunk_terms = set(self._terms.get(chunk_id, ()))
+            total = matched = 0.0
+            for term in set(tokenize(query)):
+                idf = self._idf(n, len(self._postings.get(term, ())))
+                total += idf
+                if term in chunk_terms:
+                    matched += idf
+            return matched / total if total else 0.0
+
+
+# Combine several best-first id lists; an id ranked high anywhere floats up
+def reciprocal_rank_fusion(rankings, k: int = None):
+    k = config.RRF_K if k is None else k
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            fused[chunk_id] += 1.0 / (k + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+# Lexical index for a Chroma collection, built from its stored chunks the
+# first time it is needed in this process and kept in step afterwards
+def get_lexical_index(collection):
+    index = _indexes.get(collection.name)
+    if index is not None:
+        return index
+    with _lock:
+        index = _indexes.get(collection.name)
+        if index is None:
+            index = BM25Index()
+            page_size = max(1, config.INSERT_BATCH_SIZE)
+            offset = 0
+            while True:
+                page = collection.get(include=["documents"], limit=page_size, offset=offset)
+                if not page["ids"]:
+                    break
+                index.add(page["ids"], page["documents"])
+                offset += len(page["ids"])
+            _indexes[collection.name] = index
+    return index
+
+
+def drop_lexical_index(collection_name: str):
+    with _lock:
+        _indexes.pop(collection_name, None)
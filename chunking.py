@@ -0,0 +1,121 @@
+import queue
+import re
+import threading
+from collections import deque
+
+# Markdown structure first (headings from docling's export), then the plain
+# paragraph/line/word/character fallbacks
+MARKDOWN_SEPARATORS = ("\n# ", "\n## ", "\n### ", "\n#### ", "\n\n", "\n", " ", "")
+
+
+def _pieces(text, separator):
+    # Lazy equivalent of re.split that keeps each separator at the start of
+    # the piece it introduces, skipping empty pieces
+    if not separator:
+        yield from text
+        return
+    start = 0
+    for match in re.finditer(re.escape(separator), text):
+        if match.start() > start:
+            yield text[start:match.start()]
+        start = match.start()
+    if start < len(text):
+        yield text[start:]
+
+
+def _merge(pieces, chunk_size, chunk_overlap):
+    current = deque()
+    total = 0
+    for piece in pieces:
+        if total + len(piece) > chunk_size and current:
+            chunk = "".join(current).strip()
+            if chunk:
+                yield chunk
+            # Keep a tail of up to chunk_overlap characters for the next chunk
+            while total > chunk_overlap or (total + len(piece) > chunk_size and total > 0):
+                total -= len(current.popleft())
+        current.append(piece)
+        total += len(piece)
+    chunk = "".join(current).strip()
+    if chunk:
+        yield chunk
+
+
+def _split(text, separators, chunk_size, chunk_overlap):
+    separator, rest = separators[-1], ()
+    for i, candidate in enumerate(separators):
+        if candidate == "" or candidate in text:
+            separator, rest = candidate, separators[i + 1:]
+            break
+    small = []
+    for piece in _pieces(text, separator):
+        if len(piece) < chunk_size:
+            small.append(piece)
+            continue
+        if small:
+            yield from _merge(small, chunk_size, chunk_overlap)
+            small = []
+        if rest:
+            yield from _split(piece, rest, chunk_size, chunk_overlap)
+        else:
+            yield piece
+    if small:
+        yield from _merge(small, chunk_size, chunk_overlap)
+
+
+def iter_chunks(text: str, chunk_size: int = 700, chunk_overlap: int = 100,
+                separators=MARKDOWN_SEPARATORS):
+    """Yield chunks of at most chunk_size characters, overlapping by up to
+    chunk_overlap, splitting on the first separator found in the text and
+    recursing into any piece that is still too long.
+
+    Same rules as langchain's RecursiveCharacterTextSplitter (separators kept
+    at the start of the following chunk, whitespace stripped), but chunks are
+    produced one at a time, so memory does not grow with the document.
+    """
+    return _split(text, tuple(separators), chunk_size, chunk_overlap)
+
+
+def prefetch(iterable, maxsize: int = 2):
+    """Iterate `iterable` on a background thread, at most maxsize items ahead.
+
+    The bounded queue is the backpressure: a slow consumer stops the
+    producer instead of letting items pile up. Errors in the producer are
+    re-raised in the consumer; if the consumer stops early the producer is
+    told to stop.
+    """
+    items = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+    end = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((end, None))
+        except BaseException as e:
+            put((end, e))
+
+    thread = threading.Thread(target=produce, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is end:
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,117 @@
+import os
+
+
+# Settings are read from HOLISTICA_* environment variables so a deployment
+# can tune them without code edits, e.g.
+#   HOLISTICA_GENERATION_MODEL=google/flan-t5-base streamlit run Final.py
+def _env(name, default, cast=str):
+    value = os.environ.get(f"HOLISTICA_{name}")
+    if value is None or value == "":
+        return default
+    if cast is bool:
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return cast(value)
+
+
+# --- Generation model ---
+GENERATION_TASK = "text2text-generation"
+GENERATION_MODEL = _env("GENERATION_MODEL", "google/flan-t5-small")
+GENERATION_MAX_LENGTH = _env("GENERATION_MAX_LENGTH", 150, int)
+WARMUP_MODELS = _env("WARMUP_MODELS", True, bool)
+# Warm up on a background thread instead of behind a spinner on first load
+WARMUP_BACKGROUND = _env("WARMUP_BACKGROUND", True, bool)
+STREAM_ANSWERS = _env("STREAM_ANSWERS", True, bool)
+# GENERATION_BATCHING gathers answers requested at the same time by different
+# sessions (within GENERATION_MAX_WAIT_MS, up to GENERATION_MAX_BATCH) into one
+# padded batch; beyond GENERATION_QUEUE_LIMIT waiting requests new ones are
+# turned away. Streamed answers generate one sequence at a time and are not
+# batched, so this applies with STREAM_ANSWERS=0.
+GENERATION_BATCHING = _env("GENERATION_BATCHING", True, bool)
+GENERATION_MAX_BATCH = _env("GENERATION_MAX_BATCH", 8, int)
+GENERATION_MAX_WAIT_MS = _env("GENERATION_MAX_WAIT_MS", 20, float)
+GENERATION_QUEUE_LIMIT = _env("GENERATION_QUEUE_LIMIT", 64, int)
+# Prompt size limit in tokens (flan-t5's encoder input length); retrieved
+# chunks are packed into whatever the question and instructions leave over
+PROMPT_MAX_TOKENS = _env("PROMPT_MAX_TOKENS", 512, int)
+# Seconds to wait for the next streamed token before giving up (0 = forever)
+GENERATION_TIMEOUT = _env("GENERATION_TIMEOUT", 60, float)
+
+# --- Ingestion ---
+EMBEDDING_MODEL = _env("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# EMBEDDING_BACKEND: torch, torch-int8, onnx or onnx-int8 (same model and
+# vectors up to a small drift; `python benchmark.py --compare-embeddings`
+# measures speed and drift for each). EMBEDDING_ONNX_FILE is the quantized
+# graph in the model repository used by onnx-int8.
+EMBEDDING_BACKEND = _env("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_FILE = _env("EMBEDDING_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+EMBED_BATCH_SIZE = _env("EMBED_BATCH_SIZE", 64, int)
+INSERT_BATCH_SIZE = _env("INSERT_BATCH_SIZE", 512, int)
+QUERY_CACHE_SIZE = _env("QUERY_CACHE_SIZE", 1024, int)
+# Batches each ingestion stage (split, embed) may run ahead of the next
+PIPELINE_DEPTH = _env("PIPELINE_DEPTH", 2, int)
+
+# --- Background uploads ---
+# BACKGROUND_INGEST runs uploads on a job queue the page polls every
+# JOB_POLL_SECONDS; JOB_HISTORY finished jobs are kept in the job table.
+BACKGROUND_INGEST = _env("BACKGROUND_INGEST", True, bool)
+JOB_POLL_SECONDS = _env("JOB_POLL_SECONDS", 1.0, float)
+JOB_HISTORY = _env("JOB_HISTORY", 50, int)
+
+# --- Vector store ---
+# PERSIST_STORE keeps the Chroma index and a content-hash manifest under
+# STORE_DIR so restarts and re-uploads of unchanged files skip re-indexing.
+PERSIST_STORE = _env("PERSIST_STORE", True, bool)
+STORE_DIR = _env("STORE_DIR", ".holistica")
+# Prebuilt index of app.py's built-in documents, rebuilt when they change
+SNAPSHOT_DIR = _env("SNAPSHOT_DIR", os.path.join(STORE_DIR, "snapshots"))
+
+# --- Document conversion ---
+CONVERTER_POOL_SIZE = _env("CONVERTER_POOL_SIZE", 2, int)
+PDF_NUM_THREADS = _env("PDF_NUM_THREADS", 4, int)
+# CONVERSION_WORKERS > 1 spreads batch uploads over a process pool
+# (0 = one worker per CPU); CONVERSION_TIMEOUT is seconds per file and only
+# applies with more than one worker, since serial conversion runs in-process.
+CONVERSION_WORKERS = _env("CONVERSION_WORKERS", 1, int)
+CONVERSION_TIMEOUT = _env("CONVERSION_TIMEOUT", 300, float)
+# PDFs longer than PDF_PAGES_PER_RANGE pages are converted as ranges of that
+# many pages, which run on separate workers and are stitched back in order;
+# with the markdown cache on, finished ranges are kept so a failed file
+# resumes from the ranges still missing (0 = always convert whole files).
+PDF_PAGES_PER_RANGE = _env("PDF_PAGES_PER_RANGE", 50, int)
+
+# --- Converted markdown cache ---
+MARKDOWN_CACHE = _env("MARKDOWN_CACHE", True, bool)
+MARKDOWN_CACHE_DIR = _env("MARKDOWN_CACHE_DIR", os.path.join(STORE_DIR, "markdown_cache"))
+MARKDOWN_CACHE_MAX_MB = _env("MARKDOWN_CACHE_MAX_MB", 512, float)
+
+# --- Semantic answer cache ---
+# Questions whose embedding is at least ANSWER_CACHE_THRESHOLD cosine-similar
+# to an earlier one reuse its answer until the library changes.
+ANSWER_CACHE = _env("ANSWER_CACHE", True, bool)
+ANSWER_CACHE_THRESHOLD = _env("ANSWER_CACHE_THRESHOLD", 0.95, float)
+ANSWER_CACHE_SIZE = _env("ANSWER_CACHE_SIZE", 256, int)
+ANSWER_CACHE_TTL = _env("ANSWER_CACHE_TTL", 3600, float)
+
+# --- Retrieval ---
+# "hybrid" fuses dense results with a BM25 index by reciprocal rank fusion;
+# "dense" uses Chroma similarity only.
+RETRIEVAL_MODE = _env("RETRIEVAL_MODE", "hybrid")
+RETRIEVAL_CANDIDATES = _env("RETRIEVAL_CANDIDATES", 10, int)
+RRF_K = _env("RRF_K", 60, int)
+# With no close dense match, a BM25 hit is only trusted when it holds at least
+# this share of the question's term weight (rare terms weigh more)
+BM25_MIN_COVERAGE = _env("BM25_MIN_COVERAGE", 0.6, float)
+
+# --- Instrumentation ---
+# Per-stage timing histograms shown under Insights & Balance
+METRICS = _env("METRICS", True, bool)
+
+# --- Reranking ---
+# With RERANK on, RERANK_CANDIDATES retrieved chunks are rescored by a
+# cross-encoder and the best RERANK_TOP_K kept, unless the expected cost
+# exceeds RERANK_BUDGET_MS.
+RERANK = _env("RERANK", False, bool)
+RERANK_MODEL = _env("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = _env("RERANK_CANDIDATES", 10, int)
+RERANK_TOP_K = _env("RERANK_TOP_K", 3, int)
+RERANK_BUDGET_MS = _env("RERANK_BUDGET_MS", 250, float)
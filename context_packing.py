@@ -0,0 +1,124 @@
+import logging
+from functools import lru_cache
+
+import config
+from model_registry import get_generator
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TEMPLATE = "Context information:\n{context}\n\nQuestion: {question}\n\nAnswer:"
+
+# A shared run shorter than this is a coincidence, not splitter overlap
+MIN_OVERLAP_CHARS = 20
+# Longest seam to look for; the splitter overlaps chunks by up to 100 characters
+MAX_OVERLAP_CHARS = 400
+# Don't cut a chunk down to fewer tokens than this just to fill the budget
+MIN_PARTIAL_TOKENS = 32
+
+
+class TokenCounter:
+    """Counts tokens with the generation model's tokenizer, caching per text.
+
+    Falls back to ~4 characters per token for generators without a tokenizer.
+    """
+
+    def __init__(self, tokenizer=None):
+        self.tokenizer = tokenizer
+        self.count = lru_cache(maxsize=4096)(self._count)
+
+    def _count(self, text: str) -> int:
+        if self.tokenizer is None:
+            return (len(text) + 3) // 4
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    # Tokens the model will actually see for the whole prompt
+    def count_prompt(self, prompt: str) -> int:
+        if self.tokenizer is None:
+            return self.count(prompt)
+        return len(self.tokenizer(prompt)["input_ids"])
+
+    # The longest prefix of `text` that fits in `tokens`
+    def truncate(self, text: str, tokens: int) -> str:
+        if self.tokenizer is None:
+            return text[:tokens * 4]
+        ids = self.tokenizer(text, add_special_tokens=False)["input_ids"][:tokens]
+        return self.tokenizer.decode(ids, skip_special_tokens=True)
+
+
+_counters = {}
+
+
+def get_token_counter(model_name: str = None):
+    model_name = model_name or config.GENERATION_MODEL
+    counter = _counters.get(model_name)
+    if counter is None:
+        tokenizer = getattr(get_generator(model_name), "tokenizer", None)
+        counter = _counters.setdefault(model_name, TokenCounter(tokenizer))
+    return counter
+
+
+def _seam(left: str, right: str) -> int:
+    # Length of the longest end of `left` that `right` starts with
+    for k in range(min(len(left), len(right), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:k]):
+            return k
+    return 0
+
+
+def strip_overlap(text: str, packed) -> str:
+    """Remove the parts of `text` already present in the packed chunks: the
+    whole chunk if it is contained in one of them, otherwise the overlap
+    shared with a neighbouring chunk at either end."""
+    for other in packed:
+        if text in other:
+            return ""
+        head = _seam(other, text)
+        if head:
+            text = text[head:].lstrip()
+        tail = _seam(text, other)
+        if tail:
+            text = text[:-tail].rstrip()
+    return text
+
+
+def pack_context(question: str, docs, max_tokens: int = None, counter: TokenCounter = None):
+    """Build the answer prompt from ranked chunks within a token budget.
+
+    Chunks are taken in rank order with text already in the prompt removed
+    and added while they fit in `max_tokens` (the model's input limit, so
+    nothing is silently truncated by the encoder); the first chunk that
+    doesn't fit is cut to the remaining room when that is worth it. Returns
+    (prompt, report) where the report has the token counts.
+    """
+    max_tokens = max_tokens or config.PROMPT_MAX_TOKENS
+    counter = counter or get_token_counter()
+    frame = counter.count_prompt(PROMPT_TEMPLATE.format(context="", question=question))
+    room = max_tokens - frame
+    packed = []
+    report = {"chunks": 0, "dropped": 0, "truncated": False, "deduped_chars": 0}
+    for i, doc in enumerate(docs):
+        text = strip_overlap(doc, packed)
+        report["deduped_chars"] += len(doc) - len(text)
+        if not text:
+            continue
+        label = f"Document {len(packed) + 1}: "
+        # Blank line separating entries, plus the label
+        cost = counter.count(label + text) + (1 if packed else 0)
+        if cost > room:
+            partial = room - counter.count(label) - (1 if packed else 0)
+            if partial >= MIN_PARTIAL_TOKENS:
+                packed.append(counter.truncate(text, partial))
+                report["truncated"] = True
+            else:
+                report["dropped"] += 1
+            report["dropped"] += len(docs) - i - 1
+            break
+        packed.append(text)
+        room -= cost
+    report["chunks"] = len(packed)
+    context = "\n\n".join(f"Document {i + 1}: {text}" for i, text in enumerate(packed))
+    prompt = PROMPT_TEMPLATE.format(context=context, question=question)
+    report["prompt_tokens"] = counter.count_prompt(prompt)
+    report["context_tokens"] = report["prompt_tokens"] - frame
+    report["max_tokens"] = max_tokens
+    return prompt, report
@@ -1,46 +1,14 @@
 import streamlit as st
 from pathlib import Path
-import tempfile
+import argparse
+import os
+import sys
+import time
 
-from docling.document_converter import DocumentConverter, PdfFormatOption
-from docling.backend.docling_parse_v2_backend import DoclingParseV2DocumentBackend
-from docling.datamodel.base_models import InputFormat
-from docling.datamodel.pipeline_options import PdfPipelineOptions, AcceleratorOptions, AcceleratorDevice
+from converters import convert_files, options_fingerprint, resolve_workers
+from markdown_cache import get_cache
 
-
-def convert_to_markdown(file_path: str) -> str:
-    path = Path(file_path)
-    ext = path.suffix.lower()
-
-    if ext == ".pdf":
-        pdf_opts = PdfPipelineOptions(do_ocr=False)
-        pdf_opts.accelerator_options = AcceleratorOptions(
-            num_threads=4,
-            device=AcceleratorDevice.CPU
-        )
-        converter = DocumentConverter(
-            format_options={
-                InputFormat.PDF: PdfFormatOption(
-                    pipeline_options=pdf_opts,
-                    backend=DoclingParseV2DocumentBackend
-                )
-            }
-        )
-        doc = converter.convert(file_path).document
-        return doc.export_to_markdown(image_mode="placeholder")
-
-    if ext in [".doc", ".docx"]:
-        converter = DocumentConverter()
-        doc = converter.convert(file_path).document
-        return doc.export_to_markdown(image_mode="placeholder")
-
-    if ext == ".txt":
-        try:
-            return path.read_text(encoding="utf-8")
-        except UnicodeDecodeError:
-            return path.read_text(encoding="latin-1", errors="replace")
-
-    raise ValueError(f"Unsupported extension: {ext}")
+SUPPORTED_EXTENSIONS = (".pdf", ".doc", ".docx", ".txt")
 
 
 def main():
@@ -76,29 +44,54 @@ def main():
         status = st.empty()
 
         total = len(uploaded)
-
-        for idx, up in enumerate(uploaded, start=1):
-            name = up.name
-            status.text(f"Converting {name} ({idx}/{total})")
-            with tempfile.NamedTemporaryFile(delete=False, suffix=Path(name).suffix) as tmp:
-                tmp.write(up.getvalue())
-                tmp_path = tmp.name
-
-            try:
-                md = convert_to_markdown(tmp_path)
+        downloads = [None] * total
+        completed = 0
+
+        cache = get_cache()
+
+        def on_result(idx, md, error, cache_key=None):
+            nonlocal completed
+            completed += 1
+            name = uploaded[idx].name
+            status.text(f"Converted {name} ({completed}/{total})")
+            if error:
+                st.warning(f"Failed: {name}: {error}")
+            else:
                 out_file = out_folder / f"{Path(name).stem}.md"
                 out_file.write_text(md, encoding="utf-8", errors="replace")
+                downloads[idx] = (out_file.name, md)
+                if cache_key:
+                    cache.put(cache_key, md)
+            progress.progress(completed / total)
+
+        # previously converted files come straight from the cache; the rest
+        # are converted from their in-memory bytes
+        pending = []
+        for idx, up in enumerate(uploaded):
+            data = up.getvalue()
+            suffix = Path(up.name).suffix
+            cache_key = cache.key(data, options_fingerprint(suffix)) if cache else None
+            md = cache.get(cache_key) if cache_key else None
+            if md is not None:
+                on_result(idx, md, None)
+                continue
+            pending.append((idx, cache_key, (up.name, data)))
+
+        status.text(f"Converting {len(pending)} file(s)...")
+        convert_files(
+            [source for *_, source in pending],
+            on_result=lambda j, md, error: on_result(pending[j][0], md, error, pending[j][1])
+        )
+        pending.clear()
 
-                # store for download
-                st.session_state.downloads.append((out_file.name, md))
-
-            except Exception as e:
-                st.warning(f"Failed: {name}: {e}")
-
-            progress.progress(idx / total)
+        # store for download, in upload order
+        st.session_state.downloads = [d for d in downloads if d is not None]
 
         status.text("Conversion done.")
         st.success(f"Saved markdown files to {out_folder.resolve()}")
+        if cache:
+            cache_stats = cache.stats()
+            st.caption(f"Cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
 
     # show download buttons after conversion
     if st.session_state.downloads:
@@ -113,5 +106,84 @@ def main():
             )
 
 
+# --- Command line ---
+# Output paths mirror the source tree: a/b/report.pdf -> a/b/report.md. When
+# two sources share a stem (report.pdf, report.docx) the later one in sorted
+# order keeps its extension (report.docx.md).
+def plan_outputs(src_root, dest_root):
+    src_root, dest_root = Path(src_root), Path(dest_root)
+    plan = {}
+    for src in sorted(p for p in src_root.rglob("*")
+                      if p.is_file() and p.suffix.lower() in SUPPORTED_EXTENSIONS):
+        rel = src.relative_to(src_root)
+        out = dest_root / rel.with_suffix(".md")
+        if out in plan.values():
+            out = dest_root / rel.parent / f"{rel.name}.md"
+        plan[src] = out
+    return plan
+
+
+# Up to date when the markdown is newer than its source; outputs are only
+# ever written whole, so an interrupted run resumes where it stopped
+def is_up_to_date(src, out):
+    try:
+        return out.stat().st_mtime >= src.stat().st_mtime
+    except FileNotFoundError:
+        return False
+
+
+def write_atomically(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(text, encoding="utf-8", errors="replace")
+    os.replace(tmp_path, path)
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert a directory tree of PDF/DOC/DOCX/TXT files to markdown.")
+    parser.add_argument("source", help="folder to convert (searched recursively)")
+    parser.add_argument("dest", help="folder for the .md files, mirroring the source tree")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="conversion processes (default 0 = one per CPU)")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="seconds per file (default HOLISTICA_CONVERSION_TIMEOUT)")
+    parser.add_argument("--force", action="store_true",
+                        help="reconvert files whose markdown is already up to date")
+    args = parser.parse_args(argv)
+
+    plan = plan_outputs(args.source, args.dest)
+    todo = [(src, out) for src, out in plan.items() if args.force or not is_up_to_date(src, out)]
+    workers = resolve_workers(args.workers)
+    print(f"{len(plan)} file(s) found, {len(plan) - len(todo)} up to date, "
+          f"converting {len(todo)} with {min(workers, len(todo)) or 1} worker(s)", flush=True)
+
+    done = failed = 0
+    start = time.perf_counter()
+
+    # Called as each file finishes, so nothing is held back in memory
+    def on_result(i, md, error):
+        nonlocal done, failed
+        done += 1
+        src, out = todo[i]
+        if error or md is None:
+            failed += 1
+            print(f"[{done}/{len(todo)}] FAILED {src}: {error}", file=sys.stderr, flush=True)
+            return
+        write_atomically(out, md)
+        print(f"[{done}/{len(todo)}] {src} -> {out}", flush=True)
+
+    convert_files([str(src) for src, _ in todo], workers=workers, timeout=args.timeout,
+                  on_result=on_result, keep=False)
+    print(f"Done in {time.perf_counter() - start:.1f}s: {len(todo) - failed} converted, "
+          f"{failed} failed", flush=True)
+    return 1 if failed else 0
+
+
+# `streamlit run conversionapp.py` serves the UI;
+# `python conversionapp.py SOURCE DEST` runs the batch converter
 if __name__ == "__main__":
-    main()
+    if st.runtime.exists():
+        main()
+    else:
+        sys.exit(cli())
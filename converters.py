@@ -0,0 +1,432 @@
+import io
+import math
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from pathlib import Path
+
+import config
+import metrics
+from markdown_cache import MarkdownCache, get_cache
+
+
+# docling pulls in torch and its model stack, so it is imported by the
+# builders on first conversion rather than when this module loads
+def _build_pdf_converter():
+    from docling.document_converter import DocumentConverter, PdfFormatOption
+    from docling.backend.docling_parse_v2_backend import DoclingParseV2DocumentBackend
+    from docling.datamodel.base_models import InputFormat
+    from docling.datamodel.pipeline_options import PdfPipelineOptions, AcceleratorOptions, AcceleratorDevice
+
+    pdf_opts = PdfPipelineOptions(do_ocr=False)
+    pdf_opts.accelerator_options = AcceleratorOptions(
+        num_threads=config.PDF_NUM_THREADS,
+        device=AcceleratorDevice.CPU
+    )
+    converter = DocumentConverter(
+        format_options={
+            InputFormat.PDF: PdfFormatOption(
+                pipeline_options=pdf_opts,
+                backend=DoclingParseV2DocumentBackend
+            )
+        }
+    )
+    converter.initialize_pipeline(InputFormat.PDF)
+    return converter
+
+
+def _build_word_converter():
+    from docling.document_converter import DocumentConverter
+    from docling.datamodel.base_models import InputFormat
+
+    converter = DocumentConverter()
+    converter.initialize_pipeline(InputFormat.DOCX)
+    return converter
+
+
+class ConverterPool:
+    """Up to `size` long-lived converters, each used by one thread at a time.
+
+    Converters are built on demand (pipelines initialized up front) and handed
+    back to the pool after every file, so layout models load once per slot
+    rather than once per document.
+    """
+
+    def __init__(self, factory, size):
+        self._factory = factory
+        self._size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self):
+        try:
+            converter = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self._size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    converter = self._factory()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                converter = self._idle.get()
+        try:
+            yield converter
+        finally:
+            self._idle.put(converter)
+
+    def warm_up(self):
+        with self.acquire():
+            pass
+
+
+_FACTORIES = {
+    ".pdf": _build_pdf_converter,
+    ".doc": _build_word_converter,
+    ".docx": _build_word_converter,
+}
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(ext: str) -> ConverterPool:
+    factory = _FACTORIES[ext]
+    pool = _pools.get(factory)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(factory)
+            if pool is None:
+                pool = _pools[factory] = ConverterPool(factory, config.CONVERTER_POOL_SIZE)
+    return pool
+
+
+# Initialize one PDF and one Word converter ahead of the first upload
+def warm_up():
+    for ext in (".pdf", ".docx"):
+        get_pool(ext).warm_up()
+
+
+# Identifies everything besides the file bytes that affects the markdown, so
+# cached output is not reused across incompatible converter settings
+def options_fingerprint(ext: str) -> str:
+    try:
+        from importlib.metadata import version
+        docling_version = version("docling")
+    except Exception:
+        docling_version = "unknown"
+    ext = ext.lower()
+    if ext == ".pdf":
+        options = "pdf:docling_parse_v2:ocr=0"
+    elif ext in (".doc", ".docx"):
+        options = "word:default"
+    else:
+        options = "text"
+    return f"{ext}|{options}|image_mode=placeholder|docling={docling_version}"
+
+
+# Convert uploaded file to markdown text
+def _decode_text(data: bytes) -> str:
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("latin-1", errors="replace")
+
+
+# `source` is a file path, or a (filename, bytes) pair for an upload that is
+# already in memory; docling then reads it from a stream over those bytes
+# instead of a temporary file
+def convert_to_markdown(source) -> str:
+    if isinstance(source, tuple):
+        name, data = source
+        ext = Path(name).suffix.lower()
+    else:
+        path = Path(source)
+        ext = path.suffix.lower()
+
+    if ext in _FACTORIES:
+        if isinstance(source, tuple):
+            from docling.datamodel.base_models import DocumentStream
+            source = DocumentStream(name=name, stream=io.BytesIO(data))
+        with get_pool(ext).acquire() as converter:
+            doc = converter.convert(source).document
+        return doc.export_to_markdown(image_mode="placeholder")
+
+    if ext == ".txt":
+        return _decode_text(data if isinstance(source, tuple) else path.read_bytes())
+
+    raise ValueError(f"Unsupported extension: {ext}")
+
+
+# --- Multi-core batch conversion ---
+def _init_worker(num_threads):
+    # Each worker process converts one file at a time, so it needs a single
+    # converter and only its share of the CPU threads; drop any pool built
+    # before these settings applied
+    config.PDF_NUM_THREADS = num_threads
+    config.CONVERTER_POOL_SIZE = 1
+    _pools.clear()
+
+
+def _convert_in_worker(source, timeout):
+    def _expire(signum, frame):
+        raise TimeoutError(f"Conversion timed out after {timeout:g}s")
+
+    use_alarm = bool(timeout) and hasattr(signal, "SIGALRM")
+    start = time.perf_counter()
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _expire)
+        signal.alarm(max(1, math.ceil(timeout)))
+    try:
+        return convert_to_markdown(source), None, time.perf_counter() - start
+    except Exception as e:
+        return None, str(e), time.perf_counter() - start
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+# The process pool is kept for the life of the server so each worker's
+# converters stay initialized between batches
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def _get_executor(workers):
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False, cancel_futures=True)
+            num_threads = max(1, (os.cpu_count() or 1) // workers)
+            # Forking the threaded Streamlit server with torch loaded risks
+            # deadlocks, so workers start from a fresh interpreter
+            _executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                            initargs=(num_threads,),
+                                            mp_context=multiprocessing.get_context("spawn"))
+            _executor_workers = workers
+        return _executor
+
+
+def _discard_executor(pool, kill=False):
+    global _executor
+    with _executor_lock:
+        if _executor is pool:
+            _executor = None
+    if kill:
+        terminate = getattr(pool, "terminate_workers", None)
+        if terminate is not None:
+            terminate()
+        else:
+            for process in list((getattr(pool, "_processes", None) or {}).values()):
+                process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def resolve_workers(workers=None):
+    workers = config.CONVERSION_WORKERS if workers is None else workers
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+def convert_files(sources, workers=None, timeout=None, on_result=None, keep=True):
+    """Convert every source (a path, or a (filename, bytes) pair) to markdown,
+    returning (markdown, error) pairs in input order.
+
+    With more than one worker the files are spread over a process pool and each
+    one is given `timeout` seconds: SIGALRM inside the worker stops Python-level
+    work, and the parent gives up on a file (restarting the pool) once it has
+    been running for twice that, which also covers hangs in native code. The
+    serial path runs in the calling thread and cannot be interrupted, so it has
+    no timeout. PDFs longer than PDF_PAGES_PER_RANGE pages are converted as
+    page ranges (see _PageRanges), each range a job of its own with its own
+    timeout. `on_result(index, markdown, error)` is called from the calling
+    thread as each file finishes; with keep=False the markdown is only handed
+    to on_result and the returned list stays empty, so large batches can be
+    streamed to disk.
+    """
+    workers = resolve_workers(workers)
+    timeout = config.CONVERSION_TIMEOUT if timeout is None else timeout
+    results = [None] * len(sources) if keep else []
+
+    def finish(i, result):
+        if keep:
+            results[i] = result
+        if on_result:
+            on_result(i, *result)
+
+    # (file index, page range index or None, source) for every conversion job
+    jobs = []
+    ranged = {}
+    cache = get_cache()
+    for i, source in enumerate(sources):
+        planned = _plan_page_ranges(source, config.PDF_PAGES_PER_RANGE, cache)
+        if planned is None:
+            jobs.append((i, None, source))
+            continue
+        ranged[i], missing = planned
+        jobs.extend((i, r, range_source) for r, range_source in missing)
+        if ranged[i].complete():
+            # Every range was cached by an earlier attempt
+            finish(i, ranged.pop(i).result())
+
+    def on_job(j, result):
+        i, r, _ = jobs[j]
+        if r is None:
+            finish(i, result)
+            return
+        ranged[i].add(r, *result)
+        if ranged[i].complete():
+            finish(i, ranged.pop(i).result())
+
+    _run_jobs([source for *_, source in jobs], workers, timeout, on_job)
+    return results
+
+
+def _run_jobs(sources, workers, timeout, finish):
+    if min(workers, len(sources)) <= 1:
+        for i, source in enumerate(sources):
+            try:
+                with metrics.span("convert"):
+                    markdown = convert_to_markdown(source)
+                finish(i, (markdown, None))
+            except Exception as e:
+                finish(i, (None, str(e)))
+        return
+
+    remaining = dict.fromkeys(range(len(sources)))
+    while remaining:
+        pool = _get_executor(workers)
+        futures = {pool.submit(_convert_in_worker, sources[i], timeout): i for i in remaining}
+        pending = set(futures)
+        started = {}
+        restart = False
+        while pending and not restart:
+            done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = futures.pop(future)
+                started.pop(future, None)
+                del remaining[i]
+                try:
+                    markdown, error, seconds = future.result()
+                    # Workers have their own metrics, so time the file here
+                    metrics.observe("convert", seconds)
+                    finish(i, (markdown, error))
+                except BrokenProcessPool as e:
+                    _discard_executor(pool)
+                    finish(i, (None, f"Conversion worker failed: {e}"))
+                except Exception as e:
+                    finish(i, (None, f"Conversion worker failed: {e}"))
+            if not timeout:
+                continue
+            now = time.monotonic()
+            for future in pending:
+                if future.running():
+                    started.setdefault(future, now)
+            for future, since in started.items():
+                if future in pending and now - since > 2 * timeout:
+                    i = futures[future]
+                    del remaining[i]
+                    finish(i, (None, f"Conversion timed out after {timeout:g}s"))
+                    restart = True
+        if restart:
+            # A stuck worker can't be interrupted; replace the pool and resubmit
+            # whatever had not finished yet
+            _discard_executor(pool, kill=True)
+
+
+# --- Page ranges for long PDFs ---
+class _PageRanges:
+    """A long PDF converted as consecutive page ranges and stitched back
+    together in order.
+
+    Each range is converted from a small PDF of just its pages, so ranges can
+    run on different worker processes. Finished ranges are written to the
+    markdown cache under the whole file's hash plus the page span; when a
+    range fails the file fails, but converting it again only redoes the
+    ranges that are not cached yet.
+    """
+
+    def __init__(self, name, data, page_count, pages_per_range, cache=None):
+        self.name = name
+        self.cache = cache
+        self.spans = [(first, min(first + pages_per_range - 1, page_count))
+                      for first in range(1, page_count + 1, pages_per_range)]
+        options = options_fingerprint(".pdf")
+        self.keys = [MarkdownCache.key(data, f"{options}|pages={first}-{last}")
+                     for first, last in self.spans]
+        self.parts = [cache.get(key) if cache is not None else None for key in self.keys]
+        self.errors = {}
+
+    # (range index, (filename, bytes)) for each range still to convert
+    def extract_missing(self, pdf):
+        import pypdfium2 as pdfium
+
+        stem = Path(self.name).stem
+        for r, (first, last) in enumerate(self.spans):
+            if self.parts[r] is not None:
+                continue
+            part = pdfium.PdfDocument.new()
+            try:
+                part.import_pages(pdf, list(range(first - 1, last)))
+                buffer = io.BytesIO()
+                part.save(buffer)
+            finally:
+                part.close()
+            yield r, (f"{stem}_pages_{first}-{last}.pdf", buffer.getvalue())
+
+    def add(self, r, markdown, error):
+        if error:
+            self.errors[r] = error
+            return
+        self.parts[r] = markdown
+        if self.cache is not None:
+            self.cache.put(self.keys[r], markdown)
+
+    def complete(self):
+        return all(part is not None or r in self.errors for r, part in enumerate(self.parts))
+
+    def result(self):
+        if not self.errors:
+            return "\n\n".join(self.parts), None
+        failed = "; ".join(f"pages {self.spans[r][0]}-{self.spans[r][1]}: {error}"
+                           for r, error in sorted(self.errors.items()))
+        done = sum(part is not None for part in self.parts)
+        saved = f" ({done} finished range(s) cached; a retry resumes from there)" if self.cache else ""
+        return None, f"{len(self.errors)} of {len(self.spans)} page ranges failed{saved}: {failed}"
+
+
+# (_PageRanges, missing range sources) for a PDF longer than pages_per_range,
+# or None to convert the source whole
+def _plan_page_ranges(source, pages_per_range, cache=None):
+    name = source[0] if isinstance(source, tuple) else str(source)
+    if pages_per_range <= 0 or Path(name).suffix.lower() != ".pdf":
+        return None
+    try:
+        import pypdfium2 as pdfium
+
+        name, data = source if isinstance(source, tuple) else (Path(source).name, Path(source).read_bytes())
+        pdf = pdfium.PdfDocument(data)
+    except Exception:
+        # Unreadable here too; docling reports the error for the whole file
+        return None
+    try:
+        if len(pdf) <= pages_per_range:
+            return None
+        plan = _PageRanges(name, data, len(pdf), pages_per_range, cache)
+        return plan, list(plan.extract_missing(pdf))
+    finally:
+        pdf.close()
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+
+import config
+from model_registry import EMBEDDING_BACKENDS, get_embedding_model
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class EmbeddingService:
+    """Single embedder for ingestion and queries.
+
+    Queries go through a bounded LRU cache keyed by the normalized question,
+    so repeated and popular questions skip encoding entirely.
+    """
+
+    def __init__(self, model_name=None, cache_size=None, backend=None):
+        self.model_name = model_name or config.EMBEDDING_MODEL
+        self.backend = backend or config.EMBEDDING_BACKEND
+        self.cache_size = config.QUERY_CACHE_SIZE if cache_size is None else cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        return get_embedding_model(self.model_name, self.backend)
+
+    def embed_documents(self, texts, batch_size=None):
+        if not texts:
+            return []
+        return self.model.encode(
+            list(texts), batch_size=batch_size or config.EMBED_BATCH_SIZE
+        ).tolist()
+
+    def embed_query(self, text: str):
+        key = normalize_query(text)
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return vector
+            self.misses += 1
+        vector = self.model.encode(key).tolist()
+        if self.cache_size > 0:
+            with self._lock:
+                self._cache[key] = vector
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return vector
+
+    def cache_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._cache),
+        }
+
+
+# Encode the same texts with each backend and report throughput against the
+# reference backend and how far each backend's vectors drift from its
+def compare_backends(texts, backends=EMBEDDING_BACKENDS, reference="torch", model_name=None,
+                     batch_size=None):
+    import numpy as np
+
+    batch_size = batch_size or config.EMBED_BATCH_SIZE
+    report = {}
+    reference_vectors = reference_rate = None
+    for backend in [reference] + [b for b in backends if b != reference]:
+        try:
+            model = get_embedding_model(model_name, backend)
+            model.encode(texts[:batch_size], batch_size=batch_size)  # warm-up pass
+            start = time.perf_counter()
+            vectors = np.asarray(model.encode(texts, batch_size=batch_size), dtype=np.float32)
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            report[backend] = {"error": str(e)}
+            continue
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        rate = len(texts) / elapsed if elapsed > 0 else 0.0
+        entry = {"texts_per_sec": rate}
+        if backend == reference:
+            reference_vectors, reference_rate = vectors, rate
+        elif reference_vectors is not None:
+            cosines = np.sum(vectors * reference_vectors, axis=1)
+            entry.update(
+                speedup=rate / reference_rate if reference_rate else 0.0,
+                mean_cosine=float(cosines.mean()),
+                min_cosine=float(cosines.min()),
+            )
+        report[backend] = entry
+    return report
+
+
+_service = None
+_lock = threading.Lock()
+
+
+def get_embedder():
+    global _service
+    if _service is None:
+        with _lock:
+            if _service is None:
+                _service = EmbeddingService()
+    return _service
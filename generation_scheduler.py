@@ -0,0 +1,123 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import config
+import metrics
+from model_registry import get_generator
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerBusy(RuntimeError):
+    """Raised instead of queueing when GENERATION_QUEUE_LIMIT requests are already waiting."""
+
+
+class GenerationScheduler:
+    """Micro-batches concurrent generation requests from every session.
+
+    Requests wait at most `max_wait_ms` for others to join them, then up to
+    `max_batch` prompts go through the shared pipeline as one padded batch,
+    so simultaneous questions share forward passes instead of competing for
+    CPU threads. The queue is bounded: past `max_queue` waiting requests,
+    generate() raises SchedulerBusy so an overloaded server sheds load instead
+    of building an ever longer backlog.
+    """
+
+    def __init__(self, max_batch=8, max_wait_ms=20.0, max_queue=64, model_name=None):
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self.model_name = model_name
+        self._queue = queue.Queue(maxsize=max(1, max_queue))
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "rejected": 0, "max_queue_depth": 0,
+                       "total_wait_ms": 0.0}
+        self._thread = threading.Thread(target=self._run, name="generation-scheduler", daemon=True)
+        self._thread.start()
+
+    def generate(self, prompt: str, max_length: int = None) -> str:
+        future = Future()
+        try:
+            self._queue.put_nowait((prompt, max_length or config.GENERATION_MAX_LENGTH,
+                                    time.perf_counter(), future))
+        except queue.Full:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise SchedulerBusy(f"{self._queue.maxsize} answers are already waiting") from None
+        with self._lock:
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queue.qsize())
+        return future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            with self._lock:
+                self._stats["requests"] += len(batch)
+                self._stats["batches"] += 1
+                self._stats["total_wait_ms"] += sum(started - queued for _, _, queued, _ in batch) * 1000
+            for _, _, queued, _ in batch:
+                metrics.observe("generation_queue_wait", started - queued)
+            # Prompts can only share a batch when they share generation settings
+            groups = {}
+            for request in batch:
+                groups.setdefault(request[1], []).append(request)
+            for max_length, requests in groups.items():
+                self._generate(requests, max_length)
+
+    def _generate(self, requests, max_length):
+        try:
+            generator = get_generator(self.model_name)
+            with metrics.span("generate_batch"):
+                outputs = generator([prompt for prompt, *_ in requests], max_length=max_length,
+                                    batch_size=len(requests))
+        except Exception as e:
+            logger.exception("Batched generation of %d prompt(s) failed", len(requests))
+            for *_, future in requests:
+                future.set_exception(e)
+            return
+        for (*_, future), output in zip(requests, outputs):
+            # Pipelines return one dict per prompt, or a one-item list of them
+            output = output[0] if isinstance(output, list) else output
+            future.set_result(output["generated_text"].strip())
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["mean_batch_size"] = stats["requests"] / stats["batches"] if stats["batches"] else 0.0
+        stats["mean_wait_ms"] = stats["total_wait_ms"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+
+_scheduler = None
+_lock = threading.Lock()
+
+
+# Shared scheduler for the configured generation model, or None when batching is off
+def get_scheduler():
+    global _scheduler
+    if not config.GENERATION_BATCHING:
+        return None
+    if _scheduler is None:
+        with _lock:
+            if _scheduler is None:
+                _scheduler = GenerationScheduler(config.GENERATION_MAX_BATCH,
+                                                 config.GENERATION_MAX_WAIT_MS,
+                                                 config.GENERATION_QUEUE_LIMIT)
+    return _scheduler
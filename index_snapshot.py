@@ -0,0 +1,151 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# File layout: magic, header length (little-endian uint32), JSON header
+# (checksum, ids, texts, shape), zero padding to a 64-byte boundary, then the
+# float32 vectors row by row
+_MAGIC = b"HOLISNAP1\0"
+_ALIGN = 64
+
+
+def corpus_checksum(texts, model_name=None, backend=None) -> str:
+    """Identifies a corpus and the embedding setup its vectors came from."""
+    digest = hashlib.sha256()
+    for part in [model_name or config.EMBEDDING_MODEL, backend or config.EMBEDDING_BACKEND, *texts]:
+        digest.update(part.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+class IndexSnapshot:
+    """A small, fixed corpus served straight from a memory-mapped file.
+
+    Answers `query(query_embeddings, n_results)` like a Chroma collection
+    (squared L2 distances, nearest first), so callers written against a
+    collection work unchanged, but opening it is one mmap instead of a
+    database client and queries are a single matrix-vector product.
+    """
+
+    def __init__(self, path, name="docs"):
+        self.path = Path(path)
+        self.name = name
+        with open(self.path, "rb") as f:
+            self._mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if self._mapped[:len(_MAGIC)] != _MAGIC:
+                raise ValueError("not an index snapshot")
+            start = len(_MAGIC) + 4
+            (header_length,) = struct.unpack("<I", self._mapped[len(_MAGIC):start])
+            header = json.loads(self._mapped[start:start + header_length].decode("utf-8"))
+            count, dim = header["shape"]
+            if header["offset"] + count * dim * 4 > len(self._mapped):
+                raise ValueError("snapshot is truncated")
+            self.checksum = header["checksum"]
+            self.ids = header["ids"]
+            self.texts = header["texts"]
+            self.vectors = np.frombuffer(self._mapped, dtype="<f4", count=count * dim,
+                                         offset=header["offset"]).reshape(count, dim)
+            self._norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        self.vectors = None
+        try:
+            self._mapped.close()
+        except BufferError:
+            # A caller still holds a view of the vectors; the map closes
+            # when that is released
+            pass
+
+    def count(self):
+        return len(self.ids)
+
+    def query(self, query_embeddings, n_results=10):
+        results = {"ids": [], "documents": [], "distances": []}
+        for query_vector in query_embeddings:
+            query_vector = np.asarray(query_vector, dtype=np.float32)
+            distances = self._norms - 2 * (self.vectors @ query_vector) + query_vector @ query_vector
+            order = np.argsort(distances, kind="stable")[:n_results]
+            results["ids"].append([self.ids[i] for i in order])
+            results["documents"].append([self.texts[i] for i in order])
+            results["distances"].append([float(max(distances[i], 0.0)) for i in order])
+        return results
+
+
+def write_snapshot(path, ids, texts, vectors, checksum):
+    vectors = np.ascontiguousarray(vectors, dtype="<f4")
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    header = {"checksum": checksum, "ids": list(ids), "texts": list(texts),
+              "shape": list(vectors.shape), "offset": 0}
+    # The offset is part of the header, so size the header with room for it
+    encoded = json.dumps(header).encode("utf-8")
+    offset = -(-(len(_MAGIC) + 4 + len(encoded) + 32) // _ALIGN) * _ALIGN
+    header["offset"] = offset
+    encoded = json.dumps(header).encode("utf-8")
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(_MAGIC + struct.pack("<I", len(encoded)) + encoded)
+            tmp.write(b"\0" * (offset - tmp.tell()))
+            tmp.write(vectors.tobytes())
+        os.replace(tmp_path, path)
+    except OSError:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+_snapshots = {}
+_lock = threading.Lock()
+
+
+def get_snapshot(name, texts, embed, ids=None):
+    """Process-wide snapshot of a fixed corpus, built on first use.
+
+    The file lives under SNAPSHOT_DIR and is reused across restarts while its
+    checksum matches `texts` and the embedding setup; otherwise `embed(texts)`
+    runs once and the snapshot is rewritten. Returns (snapshot, rebuilt).
+    """
+    checksum = corpus_checksum(texts)
+    snapshot = _snapshots.get(name)
+    if snapshot is not None and snapshot.checksum == checksum:
+        return snapshot, False
+    with _lock:
+        snapshot = _snapshots.get(name)
+        if snapshot is not None and snapshot.checksum == checksum:
+            return snapshot, False
+        path = Path(config.SNAPSHOT_DIR) / f"{name}.snap"
+        rebuilt = False
+        try:
+            snapshot = IndexSnapshot(path, name)
+            if snapshot.checksum != checksum:
+                snapshot.close()
+                snapshot = None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            if path.exists():
+                logger.warning("Rebuilding unreadable snapshot %s: %s", path, e)
+            snapshot = None
+        if snapshot is None:
+            ids = list(ids) if ids is not None else [f"doc{i + 1}" for i in range(len(texts))]
+            write_snapshot(path, ids, texts, embed(list(texts)), checksum)
+            snapshot = IndexSnapshot(path, name)
+            rebuilt = True
+            logger.info("Built snapshot %s: %d documents", path, len(texts))
+        _snapshots[name] = snapshot
+        # Sessions still holding the previous snapshot keep their mapping;
+        # it is closed when garbage collected
+        return snapshot, rebuilt
@@ -0,0 +1,149 @@
+import json
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+
+import config
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = ("queued", "converting", "indexing")
+
+
+class Upload(NamedTuple):
+    """The parts of a Streamlit UploadedFile a job needs, captured in the
+    script run so the job doesn't depend on the session staying alive."""
+
+    name: str
+    data: bytes
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def getvalue(self):
+        return self.data
+
+
+class JobQueue:
+    """Upload jobs run one at a time on a background thread.
+
+    Each job's state (status, progress, message, errors, stats) is kept in a
+    job table that sessions poll; in persistent mode the table is saved under
+    STORE_DIR, and jobs that were still running when the server stopped are
+    reported as interrupted on the next start. Results that only matter to
+    the submitting session (`docs`) stay in memory.
+    """
+
+    def __init__(self, root=None, history=50):
+        self.root = Path(root) if root else None
+        self.history = history
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._results = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest")
+        if self.root:
+            self.root.mkdir(parents=True, exist_ok=True)
+            jobs_path = self.root / "jobs.json"
+            if jobs_path.exists():
+                try:
+                    self._jobs = json.loads(jobs_path.read_text(encoding="utf-8"))
+                except (OSError, ValueError) as e:
+                    logger.warning("Ignoring unreadable job table %s: %s", jobs_path, e)
+            for job in self._jobs.values():
+                if job["status"] in ACTIVE:
+                    job.update(status="interrupted",
+                               message="The server restarted before this upload finished.")
+            self._save()
+
+    def _save(self):
+        if not self.root:
+            return
+        tmp_path = self.root / "jobs.json.tmp"
+        tmp_path.write_text(json.dumps(self._jobs, indent=2), encoding="utf-8")
+        tmp_path.replace(self.root / "jobs.json")
+
+    # Queue `work(job_id, uploads)`; it reports through update() and returns
+    # (docs, errors, stats)
+    def submit(self, uploads, work):
+        job_id = uuid.uuid4().hex[:12]
+        now = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            self._jobs[job_id] = {
+                "id": job_id,
+                "files": [upload.name for upload in uploads],
+                "status": "queued",
+                "progress": 0.0,
+                "message": "Waiting for earlier uploads to finish...",
+                "errors": [],
+                "stats": None,
+                "created_at": now,
+                "updated_at": now,
+            }
+            finished = [j for j in self._jobs.values() if j["status"] not in ACTIVE]
+            for old in sorted(finished, key=lambda j: j["created_at"])[:-self.history or None]:
+                self._jobs.pop(old["id"], None)
+                self._results.pop(old["id"], None)
+            self._save()
+        self._executor.submit(self._run, job_id, uploads, work)
+        return job_id
+
+    def _run(self, job_id, uploads, work):
+        try:
+            docs, errors, stats = work(job_id, uploads)
+        except Exception as e:
+            logger.exception("Upload job %s failed", job_id)
+            self.update(job_id, status="failed", message=str(e))
+            return
+        with self._lock:
+            self._results[job_id] = docs
+        self.update(job_id, status="done", progress=1.0, errors=errors, stats=stats,
+                    message=f"Added {len(docs)} document(s)"
+                            + (f", {len(errors)} failed" if errors else ""))
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields, updated_at=datetime.now().isoformat(timespec="seconds"))
+            # Progress ticks are frequent; only status changes hit the disk
+            if "status" in fields:
+                self._save()
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    # Converted documents of a finished job, handed out once
+    def take_results(self, job_id):
+        with self._lock:
+            return self._results.pop(job_id, None)
+
+    def jobs(self):
+        with self._lock:
+            return sorted((dict(j) for j in self._jobs.values()),
+                          key=lambda j: j["created_at"], reverse=True)
+
+    def pending(self):
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j["status"] in ACTIVE)
+
+
+_queue = None
+_lock = threading.Lock()
+
+
+def get_job_queue():
+    global _queue
+    if _queue is None:
+        with _lock:
+            if _queue is None:
+                root = Path(config.STORE_DIR) if config.PERSIST_STORE else None
+                _queue = JobQueue(root, history=config.JOB_HISTORY)
+    return _queue
@@ -0,0 +1,182 @@
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+# Decode straight from a memory map of the file, so the only copy made is
+# the returned string; `limit` bytes bounds partial reads such as previews
+def _read_mapped(path, limit=None):
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                if limit is None:
+                    return str(view, "utf-8")
+                with view[:limit] as head:
+                    return str(head, "utf-8", "ignore")
+
+
+class MarkdownCache:
+    """Converted markdown on disk, keyed by SHA-256 of the source bytes and
+    converter options, evicted least-recently-used once over `max_bytes`.
+
+    Pinned entries (documents currently in the library) are the library's
+    only copy of their markdown, so they are never evicted and do not count
+    towards `max_bytes`.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> size in bytes, least recently used first
+        self._entries = OrderedDict()
+        self._total = 0
+        self._pinned = set()
+        self._pinned_bytes = 0
+        existing = sorted(self.root.glob("*.md"), key=lambda p: p.stat().st_mtime)
+        for path in existing:
+            size = path.stat().st_size
+            self._entries[path.stem] = size
+            self._total += size
+
+    @staticmethod
+    def key(data: bytes, options: str) -> str:
+        digest = hashlib.sha256(data)
+        digest.update(b"\0" + options.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return self.root / f"{key}.md"
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        try:
+            markdown = _read_mapped(self._path(key))
+        except (OSError, ValueError):
+            with self._lock:
+                self._forget(key)
+                self.misses += 1
+            return None
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return markdown
+
+    # First `chars` characters of an entry, without reading the whole file
+    # or counting as a cache hit
+    def preview(self, key, chars=500):
+        try:
+            return _read_mapped(self._path(key), limit=4 * chars)[:chars]
+        except (OSError, ValueError):
+            return None
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _forget(self, key):
+        size = self._entries.pop(key, 0)
+        self._total -= size
+        if key in self._pinned:
+            self._pinned.discard(key)
+            self._pinned_bytes -= size
+
+    def pin(self, key):
+        with self._lock:
+            if key in self._entries and key not in self._pinned:
+                self._pinned.add(key)
+                self._pinned_bytes += self._entries[key]
+
+    def unpin(self, key):
+        with self._lock:
+            if key in self._pinned:
+                self._pinned.discard(key)
+                self._pinned_bytes -= self._entries.get(key, 0)
+            self._evict()
+
+    def _evict(self):
+        victims = []
+        for key in self._entries:
+            if self._total - self._pinned_bytes <= self.max_bytes:
+                break
+            if key not in self._pinned:
+                victims.append(key)
+                self._total -= self._entries[key]
+        for key in victims:
+            del self._entries[key]
+            self._path(key).unlink(missing_ok=True)
+
+    def put(self, key, markdown, pin=False):
+        data = markdown.encode("utf-8")
+        if len(data) > self.max_bytes and not pin:
+            return
+        # Concurrent puts of the same key (two users uploading one file) each
+        # get their own temp file; the last replace wins with identical bytes
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        with self._lock:
+            was_pinned = key in self._pinned
+            self._forget(key)
+            self._entries[key] = len(data)
+            self._total += len(data)
+            if pin or was_pinned:
+                self._pinned.add(key)
+                self._pinned_bytes += len(data)
+            self._evict()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "pinned": len(self._pinned),
+            "bytes": self._total,
+        }
+
+
+_cache = None
+_lock = threading.Lock()
+
+
+# Process-wide markdown store; also holds the library's pinned documents
+def get_markdown_store():
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = MarkdownCache(config.MARKDOWN_CACHE_DIR,
+                                       int(config.MARKDOWN_CACHE_MAX_MB * 1024 * 1024))
+    return _cache
+
+
+# The store for reusing conversions, or None when HOLISTICA_MARKDOWN_CACHE is off
+def get_cache():
+    return get_markdown_store() if config.MARKDOWN_CACHE else None
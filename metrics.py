@@ -0,0 +1,112 @@
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+
+# Stage timings are kept per process, like the models, so the panel shows
+# every session's uploads and questions. Each stage is a fixed-bucket
+# histogram: recording is a lock and a few additions, never a growing list.
+_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+            math.inf)
+
+_lock = threading.Lock()
+_histograms = {}
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(_BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    # Upper bound of the bucket holding the q-th quantile
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(_BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+def observe(stage: str, seconds: float):
+    if not config.METRICS:
+        return
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = Histogram()
+        histogram.observe(seconds)
+
+
+# Time a block of work under a stage name, e.g. `with span("embed"): ...`
+@contextmanager
+def span(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def snapshot():
+    with _lock:
+        rows = []
+        for stage, h in _histograms.items():
+            rows.append({
+                "stage": stage,
+                "count": h.count,
+                "total_seconds": h.total,
+                "mean_ms": h.total / h.count * 1000 if h.count else 0.0,
+                "p50_ms": h.quantile(0.5) * 1000,
+                "p95_ms": h.quantile(0.95) * 1000,
+                "max_ms": h.max * 1000,
+                "buckets": {_label(bound): count for bound, count in zip(_BUCKETS, h.counts)},
+            })
+    return rows
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def _label(bound):
+    return "+Inf" if bound == math.inf else f"{bound:g}"
+
+
+# One JSON object per stage, for log shippers
+def to_jsonl():
+    timestamp = time.time()
+    return "".join(json.dumps(dict(row, timestamp=timestamp)) + "\n" for row in snapshot())
+
+
+# Prometheus text exposition format (cumulative buckets)
+def to_prometheus(name: str = "holistica_stage_seconds"):
+    lines = [f"# HELP {name} Time spent in each ingestion and question-answering stage.",
+             f"# TYPE {name} histogram"]
+    with _lock:
+        for stage, h in sorted(_histograms.items()):
+            cumulative = 0
+            for bound, count in zip(_BUCKETS, h.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{_label(bound)}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {h.total}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,172 @@
+import logging
+import queue
+import threading
+import time
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Models live at module level, so they are loaded once per process and shared
+# by every Streamlit session (scripts are re-run, imported modules are not).
+_lock = threading.Lock()
+_generators = {}
+_embedders = {}
+_cross_encoders = {}
+_stats = {}
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        return 0.0
+
+
+def _load(registry, name, loader):
+    model = registry.get(name)
+    if model is not None:
+        return model
+
+    with _lock:
+        if name not in registry:
+            rss_before = _rss_mb()
+            start = time.perf_counter()
+            registry[name] = loader(name)
+            rss_after = _rss_mb()
+            _stats[name] = {
+                "model": name,
+                "load_seconds": round(time.perf_counter() - start, 3),
+                "rss_delta_mb": round(rss_after - rss_before, 1),
+                "rss_mb": round(rss_after, 1),
+            }
+            logger.info("Loaded %s in %.2fs (+%.1f MB RSS)",
+                        name, _stats[name]["load_seconds"], _stats[name]["rss_delta_mb"])
+    return registry[name]
+
+
+def _load_generator(name):
+    from transformers import pipeline
+    return pipeline(config.GENERATION_TASK, model=name)
+
+
+# EMBEDDING_BACKEND selects how the same sentence-transformers model runs:
+#   torch       the stock PyTorch model
+#   torch-int8  PyTorch with Linear layers dynamically quantized to int8
+#   onnx        the model's exported ONNX graph on onnxruntime
+#   onnx-int8   a quantized ONNX graph (EMBEDDING_ONNX_FILE) on onnxruntime
+EMBEDDING_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+
+def _load_embedder(name, backend="torch"):
+    from sentence_transformers import SentenceTransformer
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {EMBEDDING_BACKENDS}")
+    if backend == "onnx":
+        return SentenceTransformer(name, device="cpu", backend="onnx")
+    if backend == "onnx-int8":
+        return SentenceTransformer(name, device="cpu", backend="onnx",
+                                   model_kwargs={"file_name": config.EMBEDDING_ONNX_FILE})
+    model = SentenceTransformer(name)
+    if backend == "torch-int8":
+        import torch
+        model = torch.quantization.quantize_dynamic(model.to("cpu"), {torch.nn.Linear},
+                                                    dtype=torch.qint8)
+    return model
+
+
+def _embedder_key(model_name, backend):
+    return model_name if backend == "torch" else f"{model_name} [{backend}]"
+
+
+def _load_cross_encoder(name):
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(name, device="cpu")
+
+
+# Return the shared text2text pipeline, loading it on first use
+def get_generator(model_name: str = None):
+    return _load(_generators, model_name or config.GENERATION_MODEL, _load_generator)
+
+
+# Return the shared sentence embedding model, loading it on first use
+def get_embedding_model(model_name: str = None, backend: str = None):
+    model_name = model_name or config.EMBEDDING_MODEL
+    backend = backend or config.EMBEDDING_BACKEND
+    return _load(_embedders, _embedder_key(model_name, backend),
+                 lambda key: _load_embedder(model_name, backend))
+
+
+# Return the shared cross-encoder used for reranking, loading it on first use
+def get_cross_encoder(model_name: str = None):
+    return _load(_cross_encoders, model_name or config.RERANK_MODEL, _load_cross_encoder)
+
+
+# Install an already-built model (e.g. an offline stand-in for benchmarks)
+def set_generator(model, model_name: str = None):
+    with _lock:
+        _generators[model_name or config.GENERATION_MODEL] = model
+
+
+def set_embedding_model(model, model_name: str = None, backend: str = None):
+    key = _embedder_key(model_name or config.EMBEDDING_MODEL, backend or config.EMBEDDING_BACKEND)
+    with _lock:
+        _embedders[key] = model
+
+
+# Yield decoded text as the seq2seq model generates it. An error in the
+# generation thread is re-raised here, and a model that produces nothing for
+# GENERATION_TIMEOUT seconds raises TimeoutError instead of hanging the page.
+def stream_generate(prompt: str, max_length: int = None, model_name: str = None):
+    from transformers import TextIteratorStreamer
+
+    generator = get_generator(model_name)
+    tokenizer = generator.tokenizer
+    inputs = tokenizer(prompt, return_tensors="pt", truncation=True)
+    timeout = config.GENERATION_TIMEOUT or None
+    streamer = TextIteratorStreamer(tokenizer, skip_special_tokens=True, timeout=timeout)
+    errors = []
+
+    def _generate():
+        try:
+            generator.model.generate(**inputs, streamer=streamer,
+                                     max_length=max_length or config.GENERATION_MAX_LENGTH)
+        except Exception as e:
+            errors.append(e)
+            # Unblock the consumer; generate() never reached the end of stream
+            streamer.end()
+
+    thread = threading.Thread(target=_generate, daemon=True)
+    thread.start()
+    try:
+        for text in streamer:
+            if text:
+                yield text
+    except queue.Empty:
+        raise TimeoutError(f"No output from {model_name or config.GENERATION_MODEL} "
+                           f"for {timeout:g}s") from None
+    finally:
+        thread.join(timeout)
+    if errors:
+        raise errors[0]
+
+
+# Load the configured models ahead of the first question
+def warm_up():
+    get_generator()
+    get_embedding_model()
+    if config.RERANK:
+        get_cross_encoder()
+    return model_stats()
+
+
+def model_stats():
+    return [dict(stats) for stats in _stats.values()]
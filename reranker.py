@@ -0,0 +1,66 @@
+import logging
+import threading
+import time
+
+import config
+from model_registry import get_cross_encoder
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# Running estimate of cross-encoder cost, used to decide up front whether a
+# rerank fits in the latency budget
+_ms_per_pair = None
+_stats = {"queries": 0, "reranked": 0, "skipped": 0, "total_ms": 0.0}
+
+
+def rerank(question, ids, docs, k=None, budget_ms=None):
+    """Score (question, chunk) pairs in one batch and keep the best k.
+
+    Returns (ids, docs, report); when the estimated cost exceeds the budget
+    the original order is kept and report["reranked"] is False.
+    """
+    global _ms_per_pair
+    k = config.RERANK_TOP_K if k is None else k
+    budget_ms = config.RERANK_BUDGET_MS if budget_ms is None else budget_ms
+    report = {"pairs": len(docs), "reranked": False, "ms": 0.0}
+
+    if len(docs) <= 1:
+        return ids[:k], docs[:k], report
+    estimate = _ms_per_pair * len(docs) if _ms_per_pair is not None else None
+    if estimate is not None and budget_ms and estimate > budget_ms:
+        report["estimated_ms"] = estimate
+        with _lock:
+            _stats["queries"] += 1
+            _stats["skipped"] += 1
+            # Let the estimate decay so a one-off slow batch doesn't disable
+            # reranking for good
+            _ms_per_pair *= 0.9
+        logger.info("Rerank skipped: ~%.0f ms for %d pairs exceeds %.0f ms budget",
+                    estimate, len(docs), budget_ms)
+        return ids[:k], docs[:k], report
+
+    model = get_cross_encoder()
+    start = time.perf_counter()
+    scores = model.predict([(question, doc) for doc in docs],
+                           batch_size=len(docs), show_progress_bar=False)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    order = sorted(range(len(docs)), key=lambda i: float(scores[i]), reverse=True)[:k]
+
+    with _lock:
+        per_pair = elapsed_ms / len(docs)
+        _ms_per_pair = per_pair if _ms_per_pair is None else 0.8 * _ms_per_pair + 0.2 * per_pair
+        _stats["queries"] += 1
+        _stats["reranked"] += 1
+        _stats["total_ms"] += elapsed_ms
+    report.update(reranked=True, ms=elapsed_ms)
+    logger.info("Reranked %d pairs in %.1f ms", len(docs), elapsed_ms)
+    return [ids[i] for i in order], [docs[i] for i in order], report
+
+
+def rerank_stats():
+    with _lock:
+        stats = dict(_stats)
+    stats["avg_ms"] = stats["total_ms"] / stats["reranked"] if stats["reranked"] else 0.0
+    stats["ms_per_pair"] = _ms_per_pair or 0.0
+    return stats
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import config
+from markdown_cache import get_markdown_store
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_client = None
+_manifest = None
+
+PREVIEW_CHARS = 500
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+# One Chroma client per process; persistent under STORE_DIR when enabled
+def get_client():
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import chromadb
+                if config.PERSIST_STORE:
+                    path = Path(config.STORE_DIR) / "chroma"
+                    path.mkdir(parents=True, exist_ok=True)
+                    _client = chromadb.PersistentClient(path=str(path))
+                else:
+                    _client = chromadb.Client()
+    return _client
+
+
+class DocumentManifest:
+    """Content-hash record of every indexed document, keyed by filename.
+
+    Each entry points at the document's markdown in the markdown store, where
+    it is pinned for as long as the document is in the library. The manifest
+    also remembers which embedding model built the index, so a model change
+    can trigger a rebuild. In persistent mode it is saved under STORE_DIR;
+    otherwise it only lives for the process.
+    """
+
+    def __init__(self, root=None):
+        self.root = Path(root) if root else None
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.embedding_model = config.EMBEDDING_MODEL
+        if self.root:
+            self.root.mkdir(parents=True, exist_ok=True)
+            manifest_path = self.root / "manifest.json"
+            if manifest_path.exists():
+                try:
+                    data = json.loads(manifest_path.read_text(encoding="utf-8"))
+                    self._entries = data["documents"]
+                    self.embedding_model = data["embedding_model"]
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    logger.warning("Ignoring unreadable manifest %s: %s", manifest_path, e)
+                    self.embedding_model = None
+        store = get_markdown_store()
+        migrated = False
+        for entry in self._entries.values():
+            store.pin(entry["markdown_key"])
+            if "preview" not in entry:
+                # Manifests from before previews were stored
+                entry["preview"] = store.preview(entry["markdown_key"], PREVIEW_CHARS) or ""
+                migrated = True
+        if migrated:
+            self._save()
+
+    def _save(self):
+        if not self.root:
+            return
+        data = {"embedding_model": self.embedding_model, "documents": self._entries}
+        tmp_path = self.root / "manifest.json.tmp"
+        tmp_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        tmp_path.replace(self.root / "manifest.json")
+
+    def get(self, filename):
+        return self._entries.get(filename)
+
+    def is_indexed(self, filename, digest):
+        entry = self._entries.get(filename)
+        return entry is not None and entry["content_hash"] == digest
+
+    # True when the index was built with a different embedding model
+    def needs_rebuild(self):
+        return self.embedding_model != config.EMBEDDING_MODEL
+
+    # Markdown of an indexed upload with this content hash, as (markdown, key)
+    def load_content(self, digest):
+        for entry in self._entries.values():
+            if entry["content_hash"] == digest:
+                markdown = get_markdown_store().get(entry["markdown_key"])
+                if markdown is not None:
+                    return markdown, entry["markdown_key"]
+        return None, None
+
+    def record(self, filename, digest, markdown_key, content, size, chunks):
+        store = get_markdown_store()
+        if markdown_key not in store:
+            store.put(markdown_key, content, pin=True)
+        else:
+            store.pin(markdown_key)
+        with self._lock:
+            self._entries[filename] = {
+                "content_hash": digest,
+                "markdown_key": markdown_key,
+                "size": size,
+                "word_count": len(content.split()),
+                "preview": content[:PREVIEW_CHARS],
+                "chunks": chunks,
+                "indexed_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            self._save()
+
+    def remove(self, filename):
+        with self._lock:
+            entry = self._entries.pop(filename, None)
+            if entry is None:
+                return None
+            key = entry["markdown_key"]
+            still_used = any(e["markdown_key"] == key for e in self._entries.values())
+            self._save()
+        if not still_used:
+            # Leave it in the store as an ordinary cache entry
+            get_markdown_store().unpin(key)
+        return entry
+
+    # Forget index entries after the collection is rebuilt; markdown stays
+    # pinned until re-recorded or released
+    def clear(self):
+        with self._lock:
+            entries, self._entries = self._entries, {}
+            self.embedding_model = config.EMBEDDING_MODEL
+            self._save()
+        store = get_markdown_store()
+        for entry in entries.values():
+            store.unpin(entry["markdown_key"])
+
+    # Lightweight library entry for a document: everything the UI shows
+    # (word count, file type, preview) without its markdown, which stays in
+    # the shared markdown store under `markdown_key`
+    def handle(self, filename):
+        entry = self._entries.get(filename)
+        if entry is None:
+            return None
+        return {
+            'filename': filename,
+            'file_type': Path(filename).suffix.lower(),
+            'size': entry["size"],
+            'word_count': entry["word_count"],
+            'preview': entry.get("preview", ""),
+            'content_hash': entry["content_hash"],
+            'markdown_key': entry["markdown_key"],
+        }
+
+    def handles(self):
+        with self._lock:
+            filenames = list(self._entries)
+        return [h for h in map(self.handle, filenames) if h is not None]
+
+    def summary(self):
+        return {
+            "documents": len(self._entries),
+            "chunks": sum(e["chunks"] for e in self._entries.values()),
+            "persistent": self.root is not None,
+        }
+
+
+def get_manifest():
+    global _manifest
+    if _manifest is None:
+        with _lock:
+            if _manifest is None:
+                root = Path(config.STORE_DIR) if config.PERSIST_STORE else None
+                _manifest = DocumentManifest(root)
+                summary = _manifest.summary()
+                if summary["documents"]:
+                    logger.info("Reusing %d indexed document(s), %d chunks, from %s",
+                                summary["documents"], summary["chunks"], root)
+    return _manifest